@@ -0,0 +1,609 @@
+import asyncio
+import json
+import os
+import time
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+import httpx
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.http import parse_etags
+
+import cache
+import google_news
+from canonical import article_key
+import main
+import metrics
+import parsers
+import upstream
+
+# ================ ASGI APP ================
+# Native asyncio serving for /news and /extract: upstream fetches are awaited on
+# one event loop instead of holding a worker thread each. Every other route is
+# served by the regular Flask app through WsgiToAsgi.
+#
+# Run with any ASGI server, e.g. `uvicorn asgi:application`.
+
+MAX_CONNECTIONS = int(os.getenv('ASGI_MAX_CONNECTIONS', 200))
+MAX_KEEPALIVE = int(os.getenv('ASGI_MAX_KEEPALIVE', 50))
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of cache.SingleFlight: one task per key, shared by all awaiters"""
+
+    def __init__(self):
+        self._tasks = {}
+
+    async def do(self, key, coro_fn):
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(coro_fn())
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        # A cancelled awaiter must not cancel the fetch the others are waiting on
+        return await asyncio.shield(task)
+
+
+listing_flight = AsyncSingleFlight()
+image_flight = AsyncSingleFlight()
+content_flight = AsyncSingleFlight()
+
+_client = None
+# Image lookups still running after a request's deadline (kept referenced until done)
+_background = set()
+
+
+def get_client():
+    """The shared async upstream client, created inside the running loop"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers=upstream.DEFAULT_HEADERS,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE),
+            timeout=upstream.TIMEOUT,
+            follow_redirects=True)
+    return _client
+
+
+async def hedged(url, attempt):
+    """Async upstream hedging: await attempt(), racing a second one if the first outlasts the host's p95"""
+    delay = upstream.hedge_delay(url)
+    if delay is None:
+        return await attempt()
+
+    first = asyncio.ensure_future(attempt())
+    done, _ = await asyncio.wait([first], timeout=delay)
+    if done or upstream.expired() or not upstream.hedge_slots.acquire(blocking=False):
+        return await first
+
+    metrics.upstream_hedges.inc(upstream.host_of(url))
+    second = asyncio.ensure_future(attempt())
+    second.add_done_callback(lambda _: upstream.hedge_slots.release())
+    pending = {first, second}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            answered = [task for task in done if task.exception() is None]
+            if answered:
+                if answered[0] is second:
+                    metrics.upstream_hedge_wins.inc(upstream.host_of(url))
+                return answered[0].result()
+        # Both failed: raise the first attempt's error
+        return first.result()
+    finally:
+        # The slower attempt is cancelled, which also closes its response
+        for task in pending:
+            task.cancel()
+
+
+async def fetch(url, timeout=None):
+    return await hedged(url, lambda: _fetch(url, timeout))
+
+
+async def take_turn(url, timeout):
+    """admit() url and wait for its host governor like upstream._request() does.
+
+    Returns (breaker, governor, timeout, clamped); the governor slot must be released.
+    """
+    breaker, timeout, clamped = upstream.admit(url, timeout)
+    governor = upstream.governor_for(upstream.host_of(url))
+    try:
+        waited = await governor.acquire_async(upstream.current_priority(), upstream.queue_timeout())
+    except asyncio.CancelledError:
+        breaker.skip()
+        raise
+    timeout, clamped = upstream.admitted(url, breaker, governor, waited, timeout, clamped)
+    return breaker, governor, timeout, clamped
+
+
+async def _fetch(url, timeout):
+    host = upstream.host_of(url)
+    breaker, governor, timeout, clamped = await take_turn(url, timeout)
+    try:
+        start = metrics.upstream_started(host)
+        status = None
+        try:
+            response = await get_client().get(upstream.rewrite_url(url), timeout=timeout)
+            status = response.status_code
+            upstream.throttle(governor, status, response.headers)
+            return response
+        finally:
+            upstream.settle(breaker, status, time.perf_counter() - start, clamped)
+            metrics.upstream_finished(host, start, status)
+    finally:
+        governor.release()
+
+
+async def fetch_head(url, timeout=None, max_bytes=None):
+    """Async upstream.fetch_head(): read only up to </head> and close the connection"""
+    return await hedged(url, lambda: _fetch_head(url, timeout, max_bytes))
+
+
+async def _fetch_head(url, timeout, max_bytes):
+    max_bytes = max_bytes or upstream.HEAD_MAX_BYTES
+    host = upstream.host_of(url)
+    breaker, governor, timeout, clamped = await take_turn(url, timeout)
+    try:
+        client = get_client()
+        request = client.build_request('GET', upstream.rewrite_url(url), timeout=timeout)
+        start = metrics.upstream_started(host)
+        status = None
+        try:
+            response = await client.send(request, stream=True)
+            status = response.status_code
+            upstream.throttle(governor, status, response.headers)
+        finally:
+            upstream.settle(breaker, status, time.perf_counter() - start, clamped)
+            metrics.upstream_finished(host, start, status)
+    finally:
+        governor.release()
+
+    try:
+        if response.status_code != 200:
+            return response.status_code, str(response.url), b''
+
+        data = b''
+        async for chunk in response.aiter_bytes(upstream.HEAD_CHUNK_SIZE):
+            data, done = upstream.append_head_chunk(data, chunk, max_bytes)
+            if done:
+                break
+    finally:
+        await response.aclose()
+
+    return 200, str(response.url), data
+
+
+# ---------------- Scraping ----------------
+
+async def _snapshot(key, loader, async_loader):
+    """listing_cache lookup that awaits async_loader on a miss (stale hits refresh in the background)"""
+    value = main.listing_cache.peek(key, loader)
+    if value is None:
+        try:
+            value = await listing_flight.do(key, lambda: _load_snapshot(key, async_loader))
+        except Exception as e:
+            # Upstream failing (or circuit open): last good snapshot, marked stale
+            value = main.listing_cache.fallback(key, e)
+            if value is None:
+                raise
+    return value
+
+
+async def _load_snapshot(key, async_loader):
+    value = await async_loader()
+    # put() writes through to the SQLite backend: keep that disk I/O off the event loop
+    await asyncio.to_thread(main.listing_cache.put, key, value)
+    return value
+
+
+async def load_section(url):
+    response = await fetch(url, timeout=10)
+    if response.status_code != 200:
+        raise upstream.UpstreamError(url, response.status_code)
+    with metrics.Stage('parse'):
+        articles = await asyncio.to_thread(parsers.parse_section, response.content, url)
+    await asyncio.to_thread(main.index_section_articles, url, articles)
+    return articles
+
+
+async def scrape_bbc_section(url, max_results=10):
+    """Async main.scrape_bbc_section()"""
+    try:
+        articles = await _snapshot(('section', url), lambda: main.load_section(url), lambda: load_section(url))
+        return articles[:max_results]
+    except Exception as e:
+        main.logger.warning("Error scraping BBC section %s: %s", url, e)
+        return []
+
+
+async def load_homepage(bbc_url, latest):
+    response = await fetch(bbc_url, timeout=10)
+    if response.status_code != 200:
+        raise upstream.UpstreamError(bbc_url, response.status_code)
+    with metrics.Stage('parse'):
+        sections_news = await asyncio.to_thread(parsers.parse_homepage, response.content, latest)
+    await asyncio.to_thread(main.index_listing_sections, 'homepage', sections_news)
+    return sections_news
+
+
+async def get_eng(bbc_url='https://www.bbc.com/', latest=False):
+    """Async main.get_eng()"""
+    response = {}
+    try:
+        sections_news = await _snapshot(('homepage', bbc_url, latest),
+                                        lambda: main.load_homepage(bbc_url, latest),
+                                        lambda: load_homepage(bbc_url, latest))
+        response["status"] = 200
+        response.update(sections_news)
+    except upstream.UpstreamError as e:
+        response["status"] = 503
+        response["error"] = f"Failed to retrieve content. BBC website returned status code: {e.status}"
+    except Exception as e:
+        response["status"] = 500
+        response["error"] = str(e)
+    return response
+
+
+# ---------------- Images ----------------
+
+async def get_article_image(url):
+    """Async main.get_article_image()"""
+    key = article_key(url)
+    cached_image = main.image_cache.get(key)
+    if cached_image is not None:
+        return cached_image
+
+    with upstream.priority(max(upstream.current_priority(), upstream.IMAGES)):
+        return await image_flight.do(key, lambda: lookup_article_image(url))
+
+
+async def lookup_article_image(url):
+    key = article_key(url)
+    try:
+        real_url = url
+        if url.startswith('https://news.google.com'):
+            # Decoded in place when the id holds the URL; only opaque ids need the thread
+            real_url = google_news.decode_url(url) or await asyncio.to_thread(main.resolve_real_article_url, url)
+
+        status, _, head_bytes = await fetch_head(real_url, timeout=8)
+        image_url = main.find_head_image(head_bytes) if head_bytes else ''
+
+        if not image_url and status == 200:
+            response = await fetch(real_url, timeout=8)
+            if response.status_code == 200:
+                page = SimpleNamespace(content=response.content, url=str(response.url))
+                with metrics.Stage('parse'):
+                    image_url = await asyncio.to_thread(main.find_article_image, page)
+
+        await asyncio.to_thread(main.image_cache.set, key, image_url or '')
+        return image_url or ''
+
+    except (upstream.CircuitOpenError, upstream.DeadlineExceeded):
+        return ''
+    except Exception as e:
+        main.logger.warning("Error getting image from %s: %s", url, e)
+        if not upstream.expired():
+            await asyncio.to_thread(main.image_cache.set, key, '')
+        return ''
+
+
+async def enrich_images(articles, fallback_images, deadline=None):
+    """Async main.enrich_images(): lookups past the deadline keep running to fill image_cache"""
+    if deadline is None:
+        deadline = main.IMAGE_DEADLINE
+
+    tasks = {}
+    for index, article in enumerate(articles):
+        article['urlToImage'] = fallback_images[index] or ''
+        if article.get('url'):
+            # Tasks left running after the deadline go on without it, to fill image_cache
+            tasks[upstream.detached(asyncio.ensure_future)(get_article_image(article['url']))] = index
+
+    if not tasks:
+        return articles
+
+    done, pending = await asyncio.wait(tasks, timeout=upstream.remaining(deadline))
+    for task in done:
+        if task.result():
+            articles[tasks[task]]['urlToImage'] = task.result()
+    for task in pending:
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+
+    return articles
+
+
+# ---------------- Articles ----------------
+
+async def extract_bbc_article_content(url):
+    """Async main.extract_bbc_article_content()"""
+    key = article_key(url)
+    cached_content = main.content_cache.get(key)
+    if cached_content is not None:
+        return cached_content
+
+    return await content_flight.do(key, lambda: fetch_article_content(url))
+
+
+async def fetch_article_content(url):
+    """Async main.fetch_article_content(): raises instead of returning placeholder content"""
+    try:
+        response = await fetch(url, timeout=15)
+    except (upstream.CircuitOpenError, upstream.UpstreamBusy, upstream.DeadlineExceeded):
+        raise
+    except Exception as e:
+        if upstream.expired():
+            raise upstream.DeadlineExceeded(url) from e
+        main.logger.warning("Error extracting BBC article content: %s", e)
+        raise
+    if response.status_code != 200:
+        raise upstream.UpstreamError(url, response.status_code)
+
+    with metrics.Stage('parse'):
+        content_data = await asyncio.to_thread(main.parse_article_content, response)
+    await asyncio.to_thread(main.content_cache.set, article_key(url), content_data, negative=False)
+    await asyncio.to_thread(main.search_index.add_body, url, content_data['content'])
+    return content_data
+
+
+# ================ ENDPOINTS ================
+
+async def collect_news(query, topic, max_results):
+    """Async main.collect_news()"""
+    if query:
+        section_url = None
+        if topic and topic != 'general':
+            section_url = main.url_mapping.get(topic, 'https://www.bbc.com/news')
+            await scrape_bbc_section(section_url)
+        else:
+            await get_eng(latest=False)
+        return main.search_to_gnews(query, topic, max_results, section_url)
+
+    if topic and topic != 'general':
+        section_url = main.url_mapping.get(topic, 'https://www.bbc.com/news')
+        section_data = await scrape_bbc_section(section_url, max_results)
+        articles, listing_images = main.section_to_gnews(section_data, topic, query)
+        if articles:
+            return articles, listing_images
+
+    bbc_data = await get_eng(latest=False)
+    if bbc_data.get('status') != 200:
+        return None
+    return main.homepage_to_gnews(bbc_data, query, topic, max_results)
+
+
+async def stream_news(articles, listing_images, stream_format, resolve_images=True, image_width=None):
+    """Async main.stream_news()"""
+    for index, article in enumerate(articles):
+        if resolve_images:
+            article['urlToImage'] = main.resize_image_url(listing_images[index], image_width) or ''
+        yield main.format_news_event('article', {'index': index, 'article': article}, stream_format)
+
+    if not resolve_images:
+        yield main.format_news_event('done', {'count': len(articles)}, stream_format)
+        return
+
+    tasks = {upstream.detached(asyncio.ensure_future)(get_article_image(a['url'])): i
+             for i, a in enumerate(articles) if a.get('url')}
+    pending = set(tasks)
+    deadline = asyncio.get_running_loop().time() + upstream.remaining(main.IMAGE_DEADLINE)
+    while pending:
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            break
+        done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            index = tasks[task]
+            image_url = main.resize_image_url(task.result(), image_width)
+            if image_url and image_url != articles[index]['urlToImage']:
+                patch = {'index': index, 'url': articles[index]['url'], 'urlToImage': image_url}
+                yield main.format_news_event('image', patch, stream_format)
+    for task in pending:
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+
+    yield main.format_news_event('done', {'count': len(articles)}, stream_format)
+
+
+def host_url(scope):
+    """Like Flask's request.host_url: scheme and Host of the request, with a trailing slash"""
+    headers = dict(scope.get('headers') or [])
+    host = headers.get(b'host', b'').decode('latin-1')
+    if not host and scope.get('server'):
+        host = '%s:%s' % tuple(scope['server'])
+    return f"{scope.get('scheme', 'http')}://{host}/"
+
+
+class StreamingBody:
+    """A handler result that is sent chunk by chunk instead of as one JSON document"""
+
+    def __init__(self, chunks, content_type):
+        self.chunks = chunks
+        self.content_type = content_type
+
+
+async def news(params, scope):
+    """Async /news, same parameters and responses as the Flask endpoint"""
+    query = params.get('q', '')
+    topic = params.get('topic', '').lower()
+    try:
+        max_results = main.parse_max_results(params.get('max_results', '10'))
+    except ValueError as e:
+        return 400, {'error': str(e)}
+    stream_format = params.get('stream', '').lower()
+    if stream_format and stream_format not in main.NEWS_STREAM_MIMETYPES:
+        return 400, {'error': 'Invalid stream. Must be ndjson or sse.'}
+    images_mode = params.get('images', main.IMAGES_MODE).lower()
+    if images_mode not in main.IMAGE_MODES:
+        return 400, {'error': 'Invalid images. Must be listing, eager, lazy or none.'}
+    try:
+        image_width = main.requested_image_width(params.get('width', ''), params.get('dpr', ''))
+    except ValueError as e:
+        return 400, {'error': str(e)}
+    editions = main.parse_languages(params.get('language', 'en'))[:main.LANGUAGE_MAX]
+    stale_snapshots = cache.track_stale()
+
+    try:
+        if editions == ['english']:
+            with metrics.Stage('listing'):
+                collected = await collect_news(query, topic, max_results)
+        else:
+            # World Service fronts are parsed with BeautifulSoup; run the concurrent fan-out off the loop
+            collected = await asyncio.to_thread(main.collect_language_news, query, editions, max_results)
+        if collected is None:
+            if upstream.expired():
+                return 504, {'error': 'Request deadline exceeded'}
+            return 500, {'error': 'Failed to fetch BBC news'}
+
+        articles, listing_images = collected
+        if not articles:
+            return 404, {'error': 'No articles found'}
+
+        listing_images = main.choose_listing_images(listing_images, image_width or main.LISTING_IMAGE_WIDTH)
+        if images_mode != 'eager':
+            main.apply_image_mode(articles, listing_images, images_mode, host_url(scope), image_width)
+
+        if stream_format:
+            chunks = stream_news(articles, listing_images, stream_format,
+                                 resolve_images=images_mode == 'eager', image_width=image_width)
+            return 200, StreamingBody(chunks, main.NEWS_STREAM_MIMETYPES[stream_format])
+
+        if images_mode == 'eager':
+            with metrics.Stage('images'):
+                await enrich_images(articles, listing_images)
+            main.resize_article_images(articles, image_width)
+        payload = {'articles': articles}
+        if stale_snapshots:
+            payload['stale'] = True
+        return 200, payload
+
+    except Exception as e:
+        return 500, {'error': str(e)}
+
+
+async def extract(params, scope):
+    """Async /extract"""
+    url = params.get('url')
+    if not url:
+        return 400, {'error': 'URL parameter required'}
+    try:
+        image_width = main.requested_image_width(params.get('width', ''), params.get('dpr', ''))
+    except ValueError as e:
+        return 400, {'error': str(e)}
+
+    try:
+        content_data = await extract_bbc_article_content(url)
+    except Exception as e:
+        return main.extract_error_status(e), {'error': str(e)}
+    if image_width:
+        content_data = dict(content_data, image=main.resize_image_url(content_data.get('image'), image_width))
+    return 200, content_data
+
+
+# path -> (handler, endpoint name for main.CACHE_CONTROL / main.response_etag)
+ROUTES = {
+    '/news': (news, 'news'),
+    '/extract': (extract, 'extract'),
+}
+
+wsgi_app = WsgiToAsgi(main.app)
+
+
+def dumps(payload):
+    if main.orjson is not None and isinstance(main.app.json, main.OrjsonProvider):
+        return main.orjson.dumps(payload)
+    return json.dumps(payload).encode('utf-8')
+
+
+async def send_json(send, status, payload, endpoint=None, if_none_match=None, accept_encoding=None):
+    """Send a JSON response; successful ones carry ETag/Cache-Control, may become a 304
+    and are compressed like the Flask responses"""
+    body = dumps(payload)
+    headers = []
+    encoding = None
+    if status == 200:
+        encoding = main.choose_encoding(accept_encoding) if len(body) >= main.COMPRESS_MIN_SIZE else None
+        headers.append((b'vary', b'Accept-Encoding'))
+        if endpoint:
+            etag = main.response_etag(endpoint, payload)
+            # Weak once compressed; a 304 carries the same tag as the 200 it stands for
+            headers += [(b'etag', (f'W/"{etag}"' if encoding else f'"{etag}"').encode()),
+                        (b'cache-control', main.cache_control(endpoint, payload).encode())]
+            if if_none_match and parse_etags(if_none_match).contains_weak(etag):
+                await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+                await send({'type': 'http.response.body', 'body': b''})
+                return
+
+    if encoding:
+        body = await asyncio.to_thread(main.compress_body, body, encoding)
+        headers.append((b'content-encoding', encoding.encode()))
+
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())] + headers,
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_stream(send, status, body):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', body.content_type.encode()), (b'cache-control', b'no-cache')],
+    })
+    async for chunk in body.chunks:
+        await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if _client is not None:
+                await _client.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    route = ROUTES.get(scope.get('path'))
+    if scope['type'] == 'http' and scope['method'] == 'GET' and route:
+        handler, endpoint = route
+        path = scope['path']
+        metrics.http_in_flight.inc(path)
+        start = time.perf_counter()
+        status = 500
+        try:
+            # Like Flask's request.args.get(): first value of each parameter
+            params = {k: v[0] for k, v in parse_qs(scope['query_string'].decode('latin-1')).items()}
+            headers = dict(scope.get('headers') or [])
+            try:
+                timeout = main.request_timeout(params.get('timeout_ms', ''))
+            except ValueError as e:
+                status = 400
+                await send_json(send, status, {'error': str(e)})
+                return
+            # Streamed bodies are produced inside the deadline too
+            with upstream.deadline(timeout), upstream.priority(upstream.FOREGROUND):
+                status, payload = await handler(params, scope)
+                if isinstance(payload, StreamingBody):
+                    await send_stream(send, status, payload)
+                else:
+                    if_none_match = headers.get(b'if-none-match', b'').decode('latin-1')
+                    accept_encoding = headers.get(b'accept-encoding', b'').decode('latin-1')
+                    await send_json(send, status, payload, endpoint, if_none_match, accept_encoding)
+        finally:
+            metrics.http_in_flight.dec(path)
+            metrics.http_seconds.observe(path, value=time.perf_counter() - start)
+            metrics.http_responses.inc(path, str(status))
+        return
+
+    await wsgi_app(scope, receive, send)
@@ -0,0 +1,71 @@
+"""Google News article-id decoding: correctness on the sample corpus and speed.
+
+Decodes every link in bench/fixtures/google_news_ids.json with
+google_news.decode_url() and compares it with the expected publisher URL
+(null for ids that hold none and must be resolved over the network), then
+times single and batch decoding. Exits with status 1 on any mismatch.
+
+Run from the repository root:
+
+    python bench/bench_google_news.py [--repeat 2000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_scraping import print_table, summarize
+from stub_server import FIXTURES_DIR
+
+import google_news
+
+
+def load_corpus():
+    with open(os.path.join(FIXTURES_DIR, 'google_news_ids.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def check(corpus):
+    """Names of the corpus entries that decode to something other than expected"""
+    failures = []
+    for case in corpus:
+        decoded = google_news.decode_url(case['url'])
+        if decoded != case['expected']:
+            failures.append(case['name'])
+            print(f"FAIL {case['name']}: expected {case['expected']!r}, got {decoded!r}")
+    return failures
+
+
+def bench(corpus, repeat):
+    urls = [case['url'] for case in corpus]
+    single = []
+    for _ in range(repeat):
+        for url in urls:
+            start = time.perf_counter()
+            google_news.decode_url(url)
+            single.append(time.perf_counter() - start)
+    batch = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        google_news.decode_urls(urls)
+        batch.append(time.perf_counter() - start)
+    return {'decode_url': summarize(single), f'decode_urls x{len(urls)}': summarize(batch)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=2000, help='passes over the corpus per measurement')
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    failures = check(corpus)
+    print(f"{len(corpus) - len(failures)}/{len(corpus)} corpus ids decoded as expected")
+    print_table('Offline decoding (no network)', bench(corpus, args.repeat))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
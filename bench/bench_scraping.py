@@ -0,0 +1,194 @@
+"""Scraping and /news latency against the local fixture server.
+
+Starts bench/stub_server.py on a free port, points the upstream client at it
+with UPSTREAM_HOST_OVERRIDES, then measures:
+
+- parse time of each parser on the raw fixture bytes (no network)
+- cold (all caches cleared) and warm calls of scrape_bbc_section(), get_eng(),
+  _get(), get_article_image() and extract_bbc_article_content()
+- end-to-end /news latency percentiles under concurrent load
+
+Run from the repository root:
+
+    python bench/bench_scraping.py [--latency 50] [--jitter 20] [--error-rate 0.01]
+        [--repeat 20] [--requests 500] [--concurrency 16] [--output results.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import FIXTURES_DIR, start_stub
+
+ARTICLE_URL = 'https://www.bbc.com/news/articles/c000001001o'
+LANGUAGES = ['arabic', 'hindi', 'spanish', 'russian']
+NEWS_PATHS = ['/news', '/news?topic=world', '/news?topic=technology', '/news?topic=business',
+              '/news?topic=sports', '/news?max_results=20', '/news?q=climate', '/news?images=listing']
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Millisecond summary of a list of durations in seconds"""
+    ms = [s * 1000 for s in samples]
+    return {
+        'n': len(ms),
+        'mean_ms': round(statistics.mean(ms), 3),
+        'p50_ms': round(percentile(ms, 50), 3),
+        'p95_ms': round(percentile(ms, 95), 3),
+        'p99_ms': round(percentile(ms, 99), 3),
+        'max_ms': round(max(ms), 3),
+    }
+
+
+def timed_calls(fn, args_cycle, repeat, before=None):
+    """Durations of `repeat` calls of fn, cycling through args_cycle"""
+    samples = []
+    for i in range(repeat):
+        if before:
+            before()
+        args = args_cycle[i % len(args_cycle)]
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+def reset_caches(main):
+    """Forget every cached listing, lookup and conditional-GET validator"""
+    import upstream
+    for cache in (main.listing_cache, main.image_cache, main.url_cache, main.content_cache,
+                  upstream._parsed):
+        cache.clear()
+
+
+def bench_parsers(main, repeat):
+    import parsers
+    section = read_fixture('section_world.html')
+    homepage = read_fixture('homepage.html')
+    language = types.SimpleNamespace(content=read_fixture('language.html'))
+    article = types.SimpleNamespace(content=read_fixture('article.html'))
+    head = article.content[:article.content.find(b'</head>') + 7]
+    cases = {
+        'parsers.parse_section': (parsers.parse_section, [(section, 'https://www.bbc.com/news/world')]),
+        'parsers.parse_homepage': (parsers.parse_homepage, [(homepage, False)]),
+        'parse_language_sections': (main.parse_language_sections, [(language, 'https://www.bbc.com/arabic', False)]),
+        'find_head_image': (main.find_head_image, [(head,)]),
+        'find_article_image': (main.find_article_image, [(article,)]),
+        'parse_article_content': (main.parse_article_content, [(article,)]),
+    }
+    return {name: summarize(timed_calls(fn, args, repeat)) for name, (fn, args) in cases.items()}
+
+
+def bench_functions(main, repeat):
+    sections = sorted(set(main.url_mapping.values()))
+    cases = {
+        'scrape_bbc_section': (main.scrape_bbc_section, [(url,) for url in sections]),
+        'get_eng': (main.get_eng, [()]),
+        '_get': (main._get, [(main.urls[lang], False) for lang in LANGUAGES]),
+        'get_article_image': (main.get_article_image, [(ARTICLE_URL,)]),
+        'extract_bbc_article_content': (main.extract_bbc_article_content, [(ARTICLE_URL,)]),
+    }
+    results = {}
+    for name, (fn, args) in cases.items():
+        cold = timed_calls(fn, args, repeat, before=lambda: reset_caches(main))
+        for call_args in args:
+            fn(*call_args)
+        warm = timed_calls(fn, args, repeat)
+        results[name] = {'cold': summarize(cold), 'warm': summarize(warm)}
+    return results
+
+
+def bench_news(main, total, concurrency):
+    reset_caches(main)
+    client = main.app.test_client()
+    statuses = {}
+
+    def request(i):
+        start = time.perf_counter()
+        status = client.get(NEWS_PATHS[i % len(NEWS_PATHS)]).status_code
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(request, range(total)))
+    elapsed = time.perf_counter() - start
+
+    for _, status in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    summary = summarize([duration for duration, _ in results])
+    summary.update(concurrency=concurrency, requests_per_s=round(total / elapsed, 2), statuses=statuses)
+    return summary
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    columns = ['mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']
+    print(f"{'':>36}" + ''.join(f'{c:>10}' for c in columns))
+    for name, row in rows.items():
+        print(f'{name:>36}' + ''.join(f'{row[c]:>10.2f}' for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.0, help='stub server response delay in milliseconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random +/- spread on the delay in milliseconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of stub responses that are 503')
+    parser.add_argument('--etags', action='store_true', help='let the stub server answer conditional GETs with 304')
+    parser.add_argument('--repeat', type=int, default=20, help='calls per parser/function measurement')
+    parser.add_argument('--requests', type=int, default=500, help='total /news requests in the load test')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent /news clients')
+    parser.add_argument('--output', help='also write the results as JSON to this file')
+    parser.add_argument('--verbose', action='store_true', help="keep the app's own output")
+    args = parser.parse_args()
+
+    stub = start_stub(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, etags=args.etags)
+    os.environ['UPSTREAM_HOST_OVERRIDES'] = f"https://www.bbc.com={stub.base_url},https://bbc.com={stub.base_url}"
+    os.environ['CACHE_BACKEND'] = 'memory'
+    os.environ['WARMUP_ENABLED'] = 'false'
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    with quiet:
+        import main as app_main
+        parse_results = bench_parsers(app_main, args.repeat)
+        function_results = bench_functions(app_main, args.repeat)
+        news_results = bench_news(app_main, args.requests, args.concurrency)
+
+    print_table('Parsers (fixture bytes, no network)', parse_results)
+    print_table('Functions, cold caches', {name: r['cold'] for name, r in function_results.items()})
+    print_table('Functions, warm caches', {name: r['warm'] for name, r in function_results.items()})
+    print_table(f'/news x{args.requests}, concurrency {args.concurrency} '
+                f'({news_results["requests_per_s"]} req/s, statuses {news_results["statuses"]})',
+                {'/news': news_results})
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'timestamp': int(time.time()),
+                'config': vars(args),
+                'stub_hits': dict(stub.hits),
+                'parsers': parse_results,
+                'functions': function_results,
+                'news': news_results,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Serialization and compression cost per response size.
+
+Builds synthetic /news and /extract payloads of increasing size and times
+json vs orjson encoding and gzip vs brotli compression at the levels main.py
+uses. Run from the repository root:
+
+    python bench/bench_serialization.py [--repeat 50] [--output results.json]
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 4))
+
+
+def news_payload(count):
+    """A /news response with `count` articles"""
+    return {'articles': [
+        {
+            'title': f'Article {i}: world leaders meet to discuss the economy and climate',
+            'description': 'A summary of the story as it appears on the BBC listing page, ' * 2,
+            'url': f'https://www.bbc.com/news/articles/c{i:010d}o',
+            'urlToImage': f'https://ichef.bbci.co.uk/news/1024/branded_news/{i}/production/_1234_{i}.jpg',
+            'publishedAt': '2025-01-17T10:30:00Z',
+            'author': 'BBC News',
+            'source': 'BBC News',
+            'category': 'world',
+            'region': 'global',
+            'tags': ['world'],
+            'readTime': 1,
+            'aiSummary': ''
+        }
+        for i in range(count)
+    ]}
+
+
+def extract_payload(paragraphs):
+    """An /extract response with `paragraphs` body paragraphs"""
+    body = ''.join(f'<p>Paragraph {i} of the article body, reporting what happened and why it matters '
+                   f'to readers around the world.</p>' for i in range(paragraphs))
+    return {'content': f'<div>{body}</div>', 'image': 'https://ichef.bbci.co.uk/news/1024/branded_news/1.jpg'}
+
+
+def timed(fn, repeat):
+    """Mean milliseconds per call"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def measure(name, payload, repeat):
+    row = {'payload': name}
+    row['json_ms'], body = timed(lambda: json.dumps(payload).encode('utf-8'), repeat)
+    if orjson is not None:
+        row['orjson_ms'], _ = timed(lambda: orjson.dumps(payload), repeat)
+    row['bytes'] = len(body)
+    row['gzip_ms'], compressed = timed(lambda: gzip.compress(body, compresslevel=GZIP_LEVEL), repeat)
+    row['gzip_bytes'] = len(compressed)
+    if brotli is not None:
+        row['brotli_ms'], compressed = timed(lambda: brotli.compress(body, quality=BROTLI_QUALITY), repeat)
+        row['brotli_bytes'] = len(compressed)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=50, help='iterations per measurement')
+    parser.add_argument('--output', help='also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    rows = [measure(f'news x{n}', news_payload(n), args.repeat) for n in (10, 50, 200, 1000)]
+    rows += [measure(f'extract x{n}p', extract_payload(n), args.repeat) for n in (10, 50, 200)]
+
+    columns = ['payload', 'bytes', 'json_ms', 'orjson_ms', 'gzip_ms', 'gzip_bytes', 'brotli_ms', 'brotli_bytes']
+    columns = [c for c in columns if any(c in row for row in rows)]
+    print(' '.join(f'{c:>14}' for c in columns))
+    for row in rows:
+        print(' '.join(f'{row[c]:>14.3f}' if isinstance(row.get(c), float) else f'{row.get(c, ""):>14}' for c in columns))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'timestamp': int(time.time()), 'repeat': args.repeat, 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
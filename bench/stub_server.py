@@ -0,0 +1,155 @@
+"""Local stand-in for bbc.com that serves the HTML fixtures in bench/fixtures.
+
+Every response waits `latency` (+/- `jitter`) milliseconds, and a fraction
+`error_rate` of requests answer 503 instead. Point the app at it with
+
+    UPSTREAM_HOST_OVERRIDES=https://www.bbc.com=http://127.0.0.1:8900,https://bbc.com=http://127.0.0.1:8900
+
+Run standalone from the repository root:
+
+    python bench/stub_server.py [--port 8900] [--latency 50] [--jitter 20] [--error-rate 0.01]
+"""
+import argparse
+import hashlib
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Section paths from main.url_mapping -> fixture file
+SECTION_FIXTURES = {
+    '/news/technology': 'section_technology.html',
+    '/news/science_and_environment': 'section_science_and_environment.html',
+    '/news/business': 'section_business.html',
+    '/news/politics': 'section_politics.html',
+    '/news/world': 'section_world.html',
+    '/news/health': 'section_health.html',
+    '/news/entertainment_and_arts': 'section_entertainment_and_arts.html',
+    '/sport': 'section_sport.html',
+}
+ARTICLE_PATH = re.compile(r'/articles/|/\d{6,}$')
+
+
+def fixture_for(path):
+    """Fixture file for a request path, or None for a 404"""
+    path = path.split('?')[0].rstrip('/') or '/'
+    if path == '/':
+        return 'homepage.html'
+    if path in SECTION_FIXTURES:
+        return SECTION_FIXTURES[path]
+    if ARTICLE_PATH.search(path):
+        return 'article.html'
+    # Any other short path is a World Service front (/arabic, /zhongwen/simp, ...)
+    if path.count('/') <= 2:
+        return 'language.html'
+    return None
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, error_rate=0.0, etags=False):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.etags = etags
+        self.hits = Counter()
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def page(self, name):
+        with self._lock:
+            if name not in self._pages:
+                with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+                    body = f.read()
+                self._pages[name] = (body, '"%s"' % hashlib.md5(body).hexdigest())
+            return self._pages[name]
+
+    def handle_error(self, request, client_address):
+        # Hedged and deadline-bound clients drop connections they no longer need
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        delay = server.latency + random.uniform(-server.jitter, server.jitter)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+        name = fixture_for(self.path)
+        with server._lock:
+            server.hits[name or '404'] += 1
+        if random.random() < server.error_rate:
+            return self._send(503, b'Service Unavailable')
+        if name is None:
+            return self._send(404, b'Not Found')
+
+        body, etag = server.page(name)
+        if server.etags and self.headers.get('If-None-Match') == etag:
+            return self._send(304, b'', etag)
+        self._send(200, body, etag if server.etags else None)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def _send(self, status, body, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        if self.command != 'HEAD':
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # fetch_head() closes the connection once it has read </head>
+                pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0, etags=False):
+    """Start a StubServer on a background thread and return it"""
+    server = StubServer((host, port), latency=latency, jitter=jitter, error_rate=error_rate, etags=etags)
+    threading.Thread(target=server.serve_forever, name='stub-server', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0.0, help='mean response delay in milliseconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random +/- spread on the delay in milliseconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    parser.add_argument('--etags', action='store_true', help='send ETags and answer matching If-None-Match with 304')
+    args = parser.parse_args()
+
+    server = StubServer((args.host, args.port), latency=args.latency, jitter=args.jitter,
+                        error_rate=args.error_rate, etags=args.etags)
+    print(f"Serving {FIXTURES_DIR} on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
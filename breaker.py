@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import deque
+
+# ================ CIRCUIT BREAKER ================
+# Per-host circuit breaker with adaptive timeouts. A host whose recent calls
+# mostly fail (errors, 5xx/429, or slower than `slow_call`) is "opened": calls
+# are rejected at once for `open_seconds` instead of each waiting out a
+# timeout. Then one probe call at a time is let through ("half-open"); a
+# successful probe closes the circuit again, a failed one re-opens it.
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker and latency tracker for one upstream host"""
+
+    def __init__(self, name, window=50, min_calls=10, error_rate=0.5, slow_call=5.0, open_seconds=30.0,
+                 adaptive_timeout=True, min_timeout=1.0, timeout_multiplier=4.0):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.adaptive_timeout = adaptive_timeout
+        self.min_timeout = min_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._latencies = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self):
+        """Whether a call may go out now; in half-open state only one probe at a time"""
+        with self._lock:
+            if self.state == OPEN and time.time() - self._opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, ok, elapsed):
+        """Report a finished call: ok=False for errors and 5xx/429 responses"""
+        failed = not ok or elapsed > self.slow_call
+        with self._lock:
+            if ok:
+                self._latencies.append(elapsed)
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if failed:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                return
+
+            self._outcomes.append(failed)
+            if self.state == CLOSED and len(self._outcomes) >= self.min_calls:
+                if sum(self._outcomes) / len(self._outcomes) >= self.error_rate:
+                    self._open()
+
+    def skip(self):
+        """Forget a call let through by allow() without counting it (it was cut short by the caller)"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.time()
+        self._outcomes.clear()
+        self.opened += 1
+
+    def latency_p95(self):
+        """p95 of recent successful call times, or None before min_calls of them"""
+        with self._lock:
+            if len(self._latencies) < self.min_calls:
+                return None
+            latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def timeout(self, requested):
+        """The requested timeout, shortened to a multiple of recent p95 latency once known"""
+        p95 = self.latency_p95() if self.adaptive_timeout else None
+        if p95 is None:
+            return requested
+        return min(requested, max(self.min_timeout, p95 * self.timeout_multiplier))
+
+    def stats(self):
+        with self._lock:
+            calls = len(self._outcomes)
+            return {
+                "name": self.name,
+                "state": self.state,
+                "recent_calls": calls,
+                "recent_error_rate": round(sum(self._outcomes) / calls, 4) if calls else 0.0,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
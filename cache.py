@@ -0,0 +1,438 @@
+import contextvars
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger('BBC-API')
+
+# ================ CACHE BACKENDS ================
+# Backends persist cache entries outside the process so a fresh instance starts warm.
+# Entries are grouped by namespace (one per cache) and stored as JSON.
+
+_MISSING = object()
+
+# Keys a SnapshotCache served from an outdated snapshot because loading failed,
+# collected per request once track_stale() has been called in its context
+_stale_served = contextvars.ContextVar('stale_served', default=None)
+
+
+def track_stale():
+    """Start collecting stale snapshot keys for the current context; returns the list they go to"""
+    served = []
+    _stale_served.set(served)
+    return served
+
+
+class MemoryBackend:
+    """No-op backend: entries only live in process memory"""
+
+    def load(self, namespace, limit):
+        return []
+
+    def save(self, namespace, key, value, expires_at):
+        pass
+
+    def delete(self, namespace, key):
+        pass
+
+    def clear(self, namespace):
+        pass
+
+    def compact(self):
+        pass
+
+
+def _encode_key(key):
+    return json.dumps(key, separators=(',', ':'))
+
+
+def _decode_key(raw):
+    def to_tuple(value):
+        return tuple(to_tuple(v) for v in value) if isinstance(value, list) else value
+    return to_tuple(json.loads(raw))
+
+
+class SQLiteBackend:
+    """Local SQLite (WAL) backend.
+
+    Expired rows are dropped by compact(), which also runs automatically every
+    `compact_interval` seconds from save().
+    """
+
+    def __init__(self, path, compact_interval=3600):
+        self.path = path
+        self.compact_interval = compact_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, '
+            'expires_at REAL NOT NULL, updated_at REAL NOT NULL, '
+            'PRIMARY KEY (namespace, key))')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS entries_recent ON entries (namespace, updated_at)')
+        self._last_compact = time.time()
+
+    def load(self, namespace, limit):
+        """Return up to `limit` live (key, value, expires_at, updated_at) rows, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT key, value, expires_at, updated_at FROM entries '
+                'WHERE namespace = ? AND expires_at > ? ORDER BY updated_at DESC LIMIT ?',
+                (namespace, time.time(), limit)).fetchall()
+        return [(_decode_key(k), json.loads(v), e, u) for k, v, e, u in reversed(rows)]
+
+    def save(self, namespace, key, value, expires_at):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entries (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                (namespace, _encode_key(key), json.dumps(value), expires_at, time.time()))
+        if time.time() - self._last_compact > self.compact_interval:
+            self.compact()
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._conn.execute('DELETE FROM entries WHERE namespace = ? AND key = ?', (namespace, _encode_key(key)))
+
+    def clear(self, namespace):
+        with self._lock:
+            self._conn.execute('DELETE FROM entries WHERE namespace = ?', (namespace,))
+
+    def compact(self):
+        """Delete expired rows and fold the WAL back into the database file"""
+        with self._lock:
+            self._last_compact = time.time()
+            self._conn.execute('DELETE FROM entries WHERE expires_at <= ?', (time.time(),))
+            self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+
+def create_backend(kind, path):
+    """Build the configured backend, falling back to memory if SQLite can't be opened"""
+    if kind == 'sqlite':
+        try:
+            return SQLiteBackend(path)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("Could not open SQLite cache at %s, using memory only: %s", path, e)
+    return MemoryBackend()
+
+# ================ REQUEST COALESCING ================
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution.
+
+    The first caller for a key runs fn(); callers that arrive while it is in
+    flight wait for it and share its result (or its exception).
+    """
+
+    def __init__(self, name='singleflight'):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            self.calls += 1
+            future = self._calls.get(key)
+            if future is not None:
+                self.shared += 1
+                leader = False
+            else:
+                future = self._calls[key] = Future()
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+
+    def stats(self):
+        with self._lock:
+            return {"name": self.name, "in_flight": len(self._calls), "calls": self.calls, "shared": self.shared}
+
+# ================ BOUNDED CACHE ================
+
+
+class TTLCache:
+    """Thread-safe LRU cache with separate TTLs for positive and negative entries.
+
+    Negative entries (failed lookups, cached as '' or a fallback value) expire
+    after `negative_ttl` so they get retried, while positive entries live for
+    `ttl`. Once `maxsize` entries are stored the least recently used one is
+    evicted. Writes go through to `backend`, and the most recently used
+    entries are loaded back from it on startup.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600, negative_ttl=300, name='cache', backend=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.name = name
+        self.backend = backend or MemoryBackend()
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        for key, value, expires_at, _ in self.backend.load(name, maxsize):
+            self._data[key] = (value, expires_at)
+
+    def get(self, key, default=None):
+        """Return the live value for key, or default on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires = entry
+            if expires <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, negative=None, ttl=None):
+        """Store value; falsy values are treated as negative unless told otherwise"""
+        if negative is None:
+            negative = not value
+        if ttl is None:
+            ttl = self.negative_ttl if negative else self.ttl
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        try:
+            self.backend.save(self.name, key, value, expires_at)
+        except Exception as e:
+            logger.warning("Could not persist %s entry: %s", self.name, e)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        if entry is not None:
+            self.backend.delete(self.name, key)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        self.backend.clear(self.name)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[1] > time.time()
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Counters for monitoring cache effectiveness"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class SnapshotCache:
+    """Stale-while-revalidate cache for parsed listings.
+
+    Entries younger than `fresh_ttl` are served as-is. Older entries (up to
+    `max_stale`) are still served immediately while a background refresh runs
+    the loader again. Only a missing or too-old entry makes the caller wait on
+    the loader. A loader that raises leaves the previous snapshot in place, and
+    while loading keeps failing the last good snapshot is served whatever its
+    age, reported through track_stale(). `is_failure(exception)` tells whether
+    a loader error means upstream is failing (by default any error does), as
+    opposed to e.g. the caller running out of time. Snapshots are persisted to
+    `backend` until they are too old to serve.
+    """
+
+    def __init__(self, fresh_ttl=60, max_stale=3600, workers=4, name='snapshots', backend=None, preload=256,
+                 is_failure=None):
+        self.fresh_ttl = fresh_ttl
+        self.max_stale = max_stale
+        self.name = name
+        self.backend = backend or MemoryBackend()
+        self._data = {key: (value, updated_at) for key, value, _, updated_at in self.backend.load(name, preload)}
+        self._refreshing = set()
+        # Keys whose last load or refresh failed because upstream did
+        self._failing = set()
+        self._is_failure = is_failure or (lambda error: True)
+        self._flight = SingleFlight(name=name)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='refresh')
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.fallbacks = 0
+
+    def get(self, key, loader):
+        """Return the snapshot for key, loading it or scheduling a refresh as needed"""
+        value = self.peek(key, loader)
+        if value is not None:
+            return value
+
+        # Concurrent misses for the same key share one load
+        try:
+            return self._flight.do(key, lambda: self._load(key, loader))
+        except Exception as e:
+            value = self.fallback(key, e)
+            if value is None:
+                raise
+            return value
+
+    def _load(self, key, loader):
+        try:
+            value = loader()
+        except Exception as e:
+            self._failed(key, e)
+            raise
+        self.put(key, value)
+        return value
+
+    def _failed(self, key, error):
+        if error is None or self._is_failure(error):
+            with self._lock:
+                self._failing.add(key)
+
+    def fallback(self, key, error=None):
+        """The last good snapshot for key however old (None if there never was one), marked stale.
+
+        `error` is what loading raised; without one the key counts as failing.
+        """
+        self._failed(key, error)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            self.fallbacks += 1
+        logger.warning("Serving %s snapshot of %s from %ds ago: loading failed", self.name, key, time.time() - entry[1])
+        self._mark_stale(key)
+        return entry[0]
+
+    def _mark_stale(self, key):
+        served = _stale_served.get()
+        if served is not None:
+            served.append(key)
+
+    def peek(self, key, loader):
+        """Return the fresh or stale snapshot for key without loading, or None on a miss.
+
+        A stale hit still schedules a background refresh with `loader`.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, fetched_at = entry
+                age = now - fetched_at
+                if age < self.fresh_ttl:
+                    self.fresh_hits += 1
+                    return value
+                if age < self.max_stale:
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        self._executor.submit(self._refresh, key, loader)
+                    # Upstream is failing: this is the last good snapshot, not just an old one
+                    if key in self._failing:
+                        self._mark_stale(key)
+                    return value
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        fetched_at = time.time()
+        with self._lock:
+            self._data[key] = (value, fetched_at)
+            self._failing.discard(key)
+        try:
+            self.backend.save(self.name, key, value, fetched_at + self.max_stale)
+        except Exception as e:
+            logger.warning("Could not persist %s snapshot: %s", self.name, e)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        self.backend.clear(self.name)
+
+    def items(self):
+        """(key, value) for every stored snapshot, however old"""
+        with self._lock:
+            return [(key, value) for key, (value, _) in self._data.items()]
+
+    def refresh(self, key, loader):
+        """Run the loader now and store its result, regardless of freshness"""
+        value = loader()
+        self.put(key, value)
+        with self._lock:
+            self.refreshes += 1
+        return value
+
+    def _refresh(self, key, loader):
+        try:
+            self.refresh(key, loader)
+        except Exception as e:
+            logger.warning("Background refresh of %s failed: %s", key, e)
+            with self._lock:
+                self.refresh_failures += 1
+            self._failed(key, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "fresh_hits": self.fresh_hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "refresh_failures": self.refresh_failures,
+                "fallbacks": self.fallbacks,
+            }
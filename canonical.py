@@ -0,0 +1,64 @@
+import re
+from urllib.parse import urlsplit
+
+import google_news
+
+# ================ CANONICAL ARTICLE KEYS ================
+# The same story is linked with and without "www.", with tracking query strings
+# and trailing slashes, from several sections, and through Google News. What
+# stays the same is the BBC asset id: "c0abc123xyzo" in /news/articles/<id>, or
+# the numeric suffix of /news/world-europe-68139667 and /sport/football/68146001.
+# article_key() maps every variant of a link to one key, used to dedupe
+# listings and as the key of the per-article caches.
+
+BBC_DOMAINS = ('bbc.com', 'bbc.co.uk')
+# /news/articles/c0abc123xyzo, /sport/football/articles/cx2..., /arabic/articles/c9...
+ARTICLE_ID_RE = re.compile(r'/articles/([a-z0-9]+)$')
+# /news/world-europe-68139667, /sport/football/68146001, /2/hi/science/nature/7000000.stm
+NUMERIC_ID_RE = re.compile(r'[/-](\d{6,})(?:\.stm)?$')
+
+
+def is_bbc_host(host):
+    return any(host == domain or host.endswith('.' + domain) for domain in BBC_DOMAINS)
+
+
+def article_key(url):
+    """Canonical key of an article link.
+
+    "bbc:<asset id>" for BBC stories (Google News links are decoded to their
+    publisher URL first), "gnews:<article id>" for Google News ids that hold no
+    URL, otherwise the URL without scheme, "www.", fragment and trailing slash.
+    """
+    if not url:
+        return ''
+    google_id = google_news.article_id(url)
+    if google_id:
+        decoded = google_news.decode_article_id(google_id)
+        if not decoded:
+            return 'gnews:' + google_id
+        url = decoded
+
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    path = parts.path.rstrip('/')
+    if is_bbc_host(host):
+        match = ARTICLE_ID_RE.search(path) or NUMERIC_ID_RE.search(path)
+        if match:
+            return 'bbc:' + match.group(1)
+        # Other BBC pages (live pages, programmes) ignore tracking query strings too
+        return host + path
+    return host + path + ('?' + parts.query if parts.query else '')
+
+
+def dedupe_links(links):
+    """Non-empty links in order, keeping only the first of each article_key()"""
+    seen = set()
+    unique = []
+    for link in links:
+        key = article_key(link)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(link)
+    return unique
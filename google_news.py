@@ -0,0 +1,97 @@
+import base64
+import binascii
+from urllib.parse import urlsplit
+
+# ================ GOOGLE NEWS ARTICLE IDS ================
+# news.google.com/articles/<id> (and /rss/articles/, /read/) links carry the
+# publisher URL inside the id: a base64url-encoded protobuf message whose
+# length-delimited fields hold the article URL (field 4) and often its AMP URL
+# (field 26). Decoding it needs no network I/O. Ids in the newer opaque format
+# carry a token ("AU_yqL...") instead of a URL and return None here; only those
+# have to be resolved over the network.
+
+GOOGLE_NEWS_HOST = 'news.google.com'
+ID_PATH_MARKERS = ('articles', 'read')
+
+
+def article_id(google_url):
+    """The article id of a Google News article link, or None if it isn't one"""
+    parts = urlsplit(google_url)
+    if parts.hostname != GOOGLE_NEWS_HOST:
+        return None
+    segments = parts.path.strip('/').split('/')
+    for index, segment in enumerate(segments[:-1]):
+        if segment in ID_PATH_MARKERS:
+            return segments[index + 1] or None
+    return None
+
+
+def _varint(data, pos):
+    """Decode a protobuf varint at data[pos]; returns (value, next position)"""
+    value = shift = 0
+    while pos < len(data):
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+    raise ValueError('truncated varint')
+
+
+def protobuf_strings(data):
+    """Payloads of the length-delimited fields of a protobuf message, in order.
+
+    Stops quietly at the first malformed or truncated field.
+    """
+    pos = 0
+    try:
+        while pos < len(data):
+            key, pos = _varint(data, pos)
+            wire_type = key & 7
+            if wire_type == 0:
+                _, pos = _varint(data, pos)
+            elif wire_type == 1:
+                pos += 8
+            elif wire_type == 5:
+                pos += 4
+            elif wire_type == 2:
+                length, pos = _varint(data, pos)
+                if pos + length > len(data):
+                    return
+                yield data[pos:pos + length]
+                pos += length
+            else:
+                return
+    except ValueError:
+        return
+
+
+def decode_article_id(encoded):
+    """Publisher URL held in a Google News article id, or None (opaque or malformed id)"""
+    try:
+        data = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+    except (binascii.Error, ValueError):
+        return None
+
+    for value in protobuf_strings(data):
+        if not value.startswith((b'https://', b'http://')):
+            continue
+        try:
+            url = value.decode('utf-8')
+        except UnicodeDecodeError:
+            continue
+        if urlsplit(url).hostname:
+            return url
+    return None
+
+
+def decode_url(google_url):
+    """Publisher URL behind a Google News article link, decoded offline, or None"""
+    encoded = article_id(google_url)
+    return decode_article_id(encoded) if encoded else None
+
+
+def decode_urls(google_urls):
+    """decode_url() for many links at once: {link: publisher URL or None}"""
+    return {url: decode_url(url) for url in google_urls}
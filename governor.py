@@ -0,0 +1,149 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import Counter
+
+# ================ UPSTREAM GOVERNOR ================
+# Per-host admission control for upstream requests. A token bucket caps the
+# request rate (`rate` per second, in bursts of up to `burst`), `max_in_flight`
+# caps concurrent requests, and callers waiting for either go in priority order
+# (lowest number first, first come first served within a priority). A rate or
+# cap of 0 disables it.
+
+
+class HostGovernor:
+    """Token bucket, concurrency cap and priority queue for one upstream host"""
+
+    def __init__(self, name, rate=0.0, burst=1, max_in_flight=0):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._tokens = float(self.burst)
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._waiting = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        # ticket -> (event loop, future) of each acquire_async() currently asleep
+        self._async_waiters = {}
+        self.admitted = 0
+        self.timeouts = 0
+
+    def _wait_time(self, ticket, now):
+        """0 if ticket may go now, else seconds until it might (None: not before a release)"""
+        if self._waiting[0] != ticket or (self.max_in_flight and self.in_flight >= self.max_in_flight):
+            return None
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.rate <= 0:
+            return 0.0
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def _grant(self):
+        heapq.heappop(self._waiting)
+        if self.rate > 0:
+            self._tokens -= 1
+        self.in_flight += 1
+        self.admitted += 1
+        # The next in line may be able to go as well
+        self._notify()
+
+    def _dequeue(self, ticket):
+        self._waiting.remove(ticket)
+        heapq.heapify(self._waiting)
+        self.timeouts += 1
+        self._notify()
+
+    def _notify(self):
+        """Wake every waiter, threads and coroutines alike (called with the lock held)"""
+        self._cond.notify_all()
+        for loop, waiter in self._async_waiters.values():
+            loop.call_soon_threadsafe(_wake, waiter)
+
+    def acquire(self, priority=0, timeout=None):
+        """Wait for a token and an in-flight slot; returns the seconds waited, or None on timeout"""
+        start = time.monotonic()
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                now = time.monotonic()
+                wait = self._wait_time(ticket, now)
+                if wait == 0:
+                    self._grant()
+                    return now - start
+                if timeout is not None:
+                    left = start + timeout - now
+                    if left <= 0:
+                        self._dequeue(ticket)
+                        return None
+                    wait = left if wait is None else min(wait, left)
+                self._cond.wait(wait)
+
+    async def acquire_async(self, priority=0, timeout=None):
+        """acquire() for coroutines: sleeps on a future that release() wakes instead of blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    wait = self._wait_time(ticket, now)
+                    if wait == 0:
+                        self._grant()
+                        return now - start
+                    if timeout is not None:
+                        left = start + timeout - now
+                        if left <= 0:
+                            self._dequeue(ticket)
+                            return None
+                        wait = left if wait is None else min(wait, left)
+                    # Registered under the lock, so a wake-up can't slip in before the await
+                    waiter = loop.create_future()
+                    self._async_waiters[ticket] = (loop, waiter)
+                try:
+                    await asyncio.wait([waiter], timeout=wait)
+                finally:
+                    with self._cond:
+                        del self._async_waiters[ticket]
+        except asyncio.CancelledError:
+            with self._cond:
+                if ticket in self._waiting:
+                    self._dequeue(ticket)
+            raise
+
+    def release(self):
+        """Give back the in-flight slot taken by acquire()"""
+        with self._cond:
+            self.in_flight -= 1
+            self._notify()
+
+    def pause(self, seconds):
+        """Hold back every request for `seconds`, e.g. after a 429 Too Many Requests"""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "name": self.name,
+                "queued": len(self._waiting),
+                "queued_by_priority": dict(Counter(priority for priority, _ in self._waiting)),
+                "in_flight": self.in_flight,
+                "admitted": self.admitted,
+                "timeouts": self.timeouts,
+            }
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
@@ -1,5 +1,4 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory, Response
-import requests
+from flask import Flask, request, jsonify, render_template, send_from_directory, Response, g, redirect
 import time
 import json
 import logging
@@ -7,24 +6,51 @@ import pytz
 from datetime import datetime
 import random
 import functools
+import contextvars
 import os
 import dotenv
 import html
+import hashlib
+import re
+import gzip
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, TimeoutError as FuturesTimeout
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, quote
+from lxml import etree
+from urllib.parse import urljoin, quote, urlencode, urlsplit, urlunsplit
 import sys
 sys.path.insert(0, 'C:\\Users\\VolcanO\\AppData\\Local\\Programs\\Python\\Python313\\Lib\\site-packages')
 import bbc
+import upstream
+import parsers
+import google_news
+from canonical import article_key, dedupe_links
+from cache import TTLCache, SnapshotCache, SingleFlight, create_backend, track_stale
+from scheduler import WarmupScheduler
+from search import SearchIndex
+import metrics
+from flask.json.provider import DefaultJSONProvider
+
+# Optional speedups: orjson for serialization, brotli for compression
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 dotenv.load_dotenv()
 
 # ================ LOGGING INITIATION ================
+# Per-article chatter is logged at DEBUG; set LOG_LEVEL=DEBUG to see it
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
 logger = logging.getLogger('BBC-API')
-logger.setLevel(logging.INFO)
+logger.setLevel(LOG_LEVEL)
 
 # Simple console logging
 console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
+console_handler.setLevel(LOG_LEVEL)
 formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 console_handler.setFormatter(formatter)
 logger.addHandler(console_handler)
@@ -32,11 +58,93 @@ logger.addHandler(console_handler)
 # ================ FLASK INITIATION ================
 app = Flask(__name__, static_folder="templates", static_url_path="/static")
 
-# Simple in-memory cache for image URLs to avoid repeated scraping
-image_cache = {}
+class OrjsonProvider(DefaultJSONProvider):
+    """jsonify() through orjson (several times faster on large article lists)"""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_SORT_KEYS if self.sort_keys else 0
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+# Use the fast encoder when orjson is installed, unless FAST_JSON=false
+if orjson is not None and os.getenv('FAST_JSON', 'true').lower() not in ('0', 'false', 'no'):
+    app.json = OrjsonProvider(app)
+
+# Cache backend shared by all caches: "memory" or "sqlite" (persists across cold starts)
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory').lower()
+CACHE_PATH = os.getenv('CACHE_PATH', '/tmp/bbc-news-cache.sqlite3')
+cache_backend = create_backend(CACHE_BACKEND, CACHE_PATH)
+
+# Failed lookups are cached for NEGATIVE_CACHE_TTL seconds so they get retried
+NEGATIVE_CACHE_TTL = int(os.getenv('NEGATIVE_CACHE_TTL', 300))
+
+# Bounded in-memory cache for image URLs to avoid repeated scraping
+image_cache = TTLCache(
+    maxsize=int(os.getenv('IMAGE_CACHE_SIZE', 5000)),
+    ttl=int(os.getenv('IMAGE_CACHE_TTL', 6 * 3600)),
+    negative_ttl=NEGATIVE_CACHE_TTL,
+    name='image_cache',
+    backend=cache_backend)
 
 # Cache for resolved real URLs from Google News URLs
-url_cache = {}
+url_cache = TTLCache(
+    maxsize=int(os.getenv('URL_CACHE_SIZE', 5000)),
+    ttl=int(os.getenv('URL_CACHE_TTL', 24 * 3600)),
+    negative_ttl=NEGATIVE_CACHE_TTL,
+    name='url_cache',
+    backend=cache_backend)
+
+# Cache for extracted article bodies served by /extract
+content_cache = TTLCache(
+    maxsize=int(os.getenv('CONTENT_CACHE_SIZE', 500)),
+    ttl=int(os.getenv('CONTENT_CACHE_TTL', 6 * 3600)),
+    negative_ttl=NEGATIVE_CACHE_TTL,
+    name='content_cache',
+    backend=cache_backend)
+
+# Parsed section/homepage listings: served fresh for SECTION_FRESH_TTL seconds, then
+# served stale while a background refresh runs, for up to SECTION_MAX_STALE seconds
+listing_cache = SnapshotCache(
+    fresh_ttl=int(os.getenv('SECTION_FRESH_TTL', 120)),
+    max_stale=int(os.getenv('SECTION_MAX_STALE', 3600)),
+    name='listing_cache',
+    backend=cache_backend,
+    # Only upstream failures flag a listing as failing, not a request's own deadline
+    is_failure=upstream.is_outage)
+
+# Full-text index over every article seen in the cached listings, used by /news?q=
+search_index = SearchIndex(maxsize=int(os.getenv('SEARCH_INDEX_SIZE', 5000)))
+
+# Concurrent callers for the same upstream URL share one in-flight fetch
+image_flight = SingleFlight(name='image_flight')
+url_flight = SingleFlight(name='url_flight')
+content_flight = SingleFlight(name='content_flight')
+
+# Shared worker pool for og:image enrichment across all requests
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 16))
+# Total time (seconds) a request waits for og:image lookups before using listing images
+IMAGE_DEADLINE = float(os.getenv('IMAGE_DEADLINE', 3.0))
+image_pool = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='image')
+
+# Total time budget (milliseconds) of a /news, /image or /extract request when it has no
+# ?timeout_ms=, and the largest budget a request may ask for; 0 means no default budget
+REQUEST_TIMEOUT_MS = int(os.getenv('REQUEST_TIMEOUT_MS', 15000))
+REQUEST_TIMEOUT_MAX_MS = int(os.getenv('REQUEST_TIMEOUT_MAX_MS', 60000))
+
+# Worker pool, URL cap and total time budget (seconds) for /extract/batch
+EXTRACT_WORKERS = int(os.getenv('EXTRACT_WORKERS', 8))
+EXTRACT_BATCH_MAX = int(os.getenv('EXTRACT_BATCH_MAX', 50))
+EXTRACT_BATCH_TIMEOUT = float(os.getenv('EXTRACT_BATCH_TIMEOUT', 20.0))
+extract_pool = ThreadPoolExecutor(max_workers=EXTRACT_WORKERS, thread_name_prefix='extract')
+
+# Worker pool and shared time budget (seconds) for fetching language editions in /news
+LANGUAGE_WORKERS = int(os.getenv('LANGUAGE_WORKERS', 8))
+LANGUAGE_DEADLINE = float(os.getenv('LANGUAGE_DEADLINE', 5.0))
+# Most editions one /news request may ask for
+LANGUAGE_MAX = int(os.getenv('LANGUAGE_MAX', 8))
+language_pool = ThreadPoolExecutor(max_workers=LANGUAGE_WORKERS, thread_name_prefix='language')
 
 # ================ DHAKA TIME ================
 def ctime():
@@ -80,447 +188,488 @@ urls = {
     "yoruba": "https://www.bbc.com/yoruba"
 }
 
+# ISO 639-1 codes accepted by /news?language= for each edition in `urls`
+language_codes = {
+    "ar": "arabic", "zh": "chinese", "id": "indonesian", "ky": "kyrgyz", "fa": "persian",
+    "so": "somali", "tr": "turkish", "vi": "vietnamese", "az": "azeri", "fr": "french",
+    "ja": "japanese", "mr": "marathi", "pt": "portuguese", "es": "spanish", "uk": "ukrainian",
+    "bn": "bengali", "ha": "hausa", "rw": "kinyarwanda", "ne": "nepali", "ru": "russian",
+    "sw": "swahili", "ur": "urdu", "my": "burmese", "hi": "hindi", "rn": "kirundi",
+    "ps": "pashto", "si": "sinhala", "ta": "tamil", "uz": "uzbek", "en": "english",
+    "yo": "yoruba",
+}
+
+def parse_languages(value):
+    """Edition names from a comma-separated /news?language= value (codes or names).
+
+    Unknown languages are logged and skipped; English if none is left.
+    """
+    editions = []
+    for code in value.lower().split(','):
+        code = code.strip()
+        if not code:
+            continue
+        edition = code if code in urls else language_codes.get(code)
+        if edition is None:
+            logger.info("Ignoring unknown language: %s", code)
+            continue
+        if edition not in editions:
+            editions.append(edition)
+    return editions or ['english']
+
+# ---------------- Topic Dict ----------------
+# Map /news topics to specific BBC section URLs for accurate categorization
+url_mapping = {
+    'technology': 'https://www.bbc.com/news/technology',
+    'science': 'https://www.bbc.com/news/science_and_environment',
+    'business': 'https://www.bbc.com/news/business',
+    'politics': 'https://www.bbc.com/news/politics',
+    'world': 'https://www.bbc.com/news/world',
+    'health': 'https://www.bbc.com/news/health',
+    'entertainment': 'https://www.bbc.com/news/entertainment_and_arts',
+    'sports': 'https://www.bbc.com/sport',
+    'geopolitics': 'https://www.bbc.com/news/world',
+    'stock_market': 'https://www.bbc.com/news/business',
+    'food': 'https://www.bbc.com/news/world',
+    'defense': 'https://www.bbc.com/news/world',
+}
+
+# Search index sources of the English edition (the homepage and topic sections);
+# World Service fronts are indexed under their own URLs
+english_sources = frozenset({'homepage', 'https://www.bbc.com/news', *url_mapping.values()})
+
 # ================ HELPING FUNCTIONS ================
 
 # Remove complex async decorators that might cause issues
 
+@metrics.timed('resolve')
 def resolve_real_article_url(google_url):
-    """Resolve Google News URL to real article URL using redirects or decoding"""
-    if google_url in url_cache:
-        print(f"Found cached real URL for {google_url}: {url_cache[google_url]}")
-        return url_cache[google_url]
-
+    """Resolve Google News URL to real article URL by decoding its id, or following redirects"""
+    # Direct publisher URLs (e.g. BBC links from the listings) need no resolving
+    if not google_url.startswith('https://news.google.com'):
+        return google_url
+
+    # Most ids carry the publisher URL themselves: no network needed (or worth caching)
+    decoded_url = google_news.decode_url(google_url)
+    if decoded_url:
+        logger.debug("Decoded real URL for %s: %s", google_url, decoded_url)
+        return decoded_url
+
+    key = article_key(google_url)
+    cached_url = url_cache.get(key)
+    if cached_url is not None:
+        logger.debug("Found cached real URL for %s: %s", google_url, cached_url)
+        return cached_url
+
+    return url_flight.do(key, lambda: lookup_real_article_url(google_url))
+
+def lookup_real_article_url(google_url):
+    """Network fallback of resolve_real_article_url() for ids that hold no URL: follow the redirects"""
+    key = article_key(google_url)
     try:
-        # Option A: Follow redirects (simplest and most reliable)
-        print(f"Following redirects for: {google_url}")
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        }
-        response = requests.get(google_url, headers=headers, timeout=5, allow_redirects=True)
+        logger.debug("Following redirects for: %s", google_url)
+        response = upstream.get(google_url, timeout=5, allow_redirects=True)
         final_url = response.url
 
         # Check if we successfully redirected to a non-Google URL
         if not final_url.startswith('https://news.google.com'):
-            print(f"Successfully resolved to real URL: {final_url}")
-            url_cache[google_url] = final_url
+            logger.debug("Successfully resolved to real URL: %s", final_url)
+            url_cache[key] = final_url
             return final_url
-        else:
-            print("Redirect didn't work, final URL still Google News. Trying manual decoding...")
 
     except Exception as e:
-        print(f"Redirect failed: {e}. Trying manual decoding...")
-
-    # Option B: Manual base64 decoding fallback
-    try:
-        import base64
-        import re
+        logger.warning("Redirect failed for %s: %s", google_url, e)
 
-        # Extract the base64 encoded part after /articles/
-        if '/articles/' in google_url:
-            encoded_part = google_url.split('/articles/')[1].split('?')[0]
-            print(f"Attempting to decode base64 part: {encoded_part[:50]}...")
+    # If all methods fail, return the original URL
+    logger.warning("All resolution methods failed, using original URL: %s", google_url)
+    if not upstream.expired():
+        # Out of time is not unresolvable: only remember the failure if the lookup ran to the end
+        url_cache.set(key, google_url, negative=True)
+    return google_url
 
-            # Try to decode the base64 string
-            try:
-                decoded_bytes = base64.urlsafe_b64decode(encoded_part + '==')
-                decoded_text = decoded_bytes.decode('utf-8', errors='ignore')
-                print(f"Decoded text preview: {repr(decoded_text[:100])}")
-
-                # Look for URLs in the decoded text
-                url_patterns = [
-                    r'https?://[^\x00-\x1f\x7f-\x9f\s\"\'<>]+',  # Basic URL pattern
-                    r'https?://[^\s\"\'<>]+',  # URL without control chars
-                ]
-
-                for pattern in url_patterns:
-                    urls = re.findall(pattern, decoded_text)
-                    if urls:
-                        print(f"Found potential URLs with pattern: {len(urls)}")
-                        for url in urls[:3]:  # Check first few URLs
-                            print(f"  Testing URL: {url[:100]}...")
-                            # Validate the URL by making a quick HEAD request
-                            try:
-                                test_response = requests.head(url, timeout=3, allow_redirects=True)
-                                if test_response.status_code == 200:
-                                    print(f"  Valid real URL found: {url}")
-                                    url_cache[google_url] = url
-                                    return url
-                            except:
-                                continue
-
-            except Exception as decode_e:
-                print(f"Base64 decoding failed: {decode_e}")
+@metrics.timed('parse')
+def find_head_image(head_bytes):
+    """Read og:image (or twitter:image) from the <head> of an article page"""
+    parser = etree.HTMLPullParser(events=('start',))
+    parser.feed(head_bytes)
 
-    except Exception as e:
-        print(f"Manual decoding failed: {e}")
+    og_image = twitter_image = ''
+    for _, elem in parser.read_events():
+        if elem.tag != 'meta':
+            continue
+        content = (elem.get('content') or '').strip()
+        if not content.startswith('http'):
+            continue
+        name = elem.get('property') or elem.get('name') or ''
+        if name == 'og:image' and not og_image:
+            og_image = content
+            break
+        if name == 'twitter:image' and not twitter_image:
+            twitter_image = content
+    parser.close()
+
+    if og_image:
+        logger.debug("Found og:image: %s", og_image)
+    elif twitter_image:
+        logger.debug("Found twitter:image: %s", twitter_image)
+    return og_image or twitter_image
+
+def find_article_image(response):
+    """Pick the article image from a fetched article page"""
+    soup = BeautifulSoup(response.content, 'html.parser')
+
+    # Try Open Graph image first (most reliable)
+    og_image = soup.find('meta', property='og:image')
+    if og_image and og_image.get('content'):
+        image_url = og_image['content']
+        # Ensure it's a full URL
+        if image_url.startswith('http'):
+            logger.debug("Found og:image: %s", image_url)
+            return image_url
+
+    # Try Twitter image as fallback
+    twitter_image = soup.find('meta', attrs={'name': 'twitter:image'})
+    if twitter_image and twitter_image.get('content'):
+        image_url = twitter_image['content']
+        if image_url.startswith('http'):
+            logger.debug("Found twitter:image: %s", image_url)
+            return image_url
+
+    # Try first img tag with reasonable size as last resort
+    img_tags = soup.find_all('img')
+    for img in img_tags:
+        img_src = img.get('src')
+        if img_src:
+            if img_src.startswith('http'):
+                full_url = img_src
+            elif img_src.startswith('//'):
+                full_url = 'https:' + img_src
+            else:
+                full_url = urljoin(response.url, img_src)
+
+            # Check if image is reasonably sized (not icons)
+            width = img.get('width')
+            height = img.get('height')
+            if width and height:
+                try:
+                    w = int(width)
+                    h = int(height)
+                    if w >= 200 and h >= 150:  # Minimum size for article images
+                        logger.debug("Found suitable img tag: %s", full_url)
+                        return full_url
+                except:
+                    pass
+            else:
+                # If no dimensions, check if it looks like a content image
+                if 'article' in img_src.lower() or 'content' in img_src.lower() or 'photo' in img_src.lower():
+                    logger.debug("Found content img tag: %s", full_url)
+                    return full_url
 
-    # If all methods fail, return the original URL
-    print(f"All resolution methods failed, using original URL: {google_url}")
-    url_cache[google_url] = google_url
-    return google_url
+    return ''
 
 def get_article_image(url):
     """Extract image from article URL with proper URL resolution and caching"""
-    print(f"Attempting to get image for URL: {url}")
-    if url in image_cache:
-        print(f"Found cached image for {url}: {image_cache[url]}")
-        return image_cache[url]
-
+    logger.debug("Attempting to get image for URL: %s", url)
+    # Every link to the same story shares one cache entry and one lookup
+    key = article_key(url)
+    cached_image = image_cache.get(key)
+    if cached_image is not None:
+        logger.debug("Found cached image for %s: %s", url, cached_image)
+        return cached_image
+
+    # Queued behind listing fetches at rate-limited hosts; background callers
+    # (warm-up, refreshes) keep their lower priority
+    with upstream.priority(max(upstream.current_priority(), upstream.IMAGES)):
+        return image_flight.do(key, lambda: lookup_article_image(url))
+
+def lookup_article_image(url):
+    """Uncached og:image lookup behind get_article_image()"""
+    key = article_key(url)
     try:
         # Resolve Google News URL to real article URL first
         real_url = resolve_real_article_url(url)
-        print(f"Resolved URL: {real_url}")
-
-        # Now fetch the real article page for og:image
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        }
+        logger.debug("Resolved URL: %s", real_url)
+
+        # Fast path: stream only the <head> and read og:image/twitter:image from it
+        logger.debug("Fetching article head: %s", real_url)
+        status, _, head_bytes = upstream.fetch_head(real_url, timeout=8)
+        logger.debug("Response status: %s", status)
+        image_url = find_head_image(head_bytes) if head_bytes else ''
 
-        print(f"Fetching article page: {real_url}")
-        response = requests.get(real_url, headers=headers, timeout=8)
-        print(f"Response status: {response.status_code}, final URL: {response.url}")
-
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            # Try Open Graph image first (most reliable)
-            og_image = soup.find('meta', property='og:image')
-            if og_image and og_image.get('content'):
-                image_url = og_image['content']
-                # Ensure it's a full URL
-                if image_url.startswith('http'):
-                    print(f"Found og:image: {image_url}")
-                    image_cache[url] = image_url
-                    return image_url
-
-            # Try Twitter image as fallback
-            twitter_image = soup.find('meta', attrs={'name': 'twitter:image'})
-            if twitter_image and twitter_image.get('content'):
-                image_url = twitter_image['content']
-                if image_url.startswith('http'):
-                    print(f"Found twitter:image: {image_url}")
-                    image_cache[url] = image_url
-                    return image_url
-
-            # Try first img tag with reasonable size as last resort
-            img_tags = soup.find_all('img')
-            for img in img_tags:
-                img_src = img.get('src')
-                if img_src:
-                    if img_src.startswith('http'):
-                        full_url = img_src
-                    elif img_src.startswith('//'):
-                        full_url = 'https:' + img_src
-                    else:
-                        full_url = urljoin(response.url, img_src)
-
-                    # Check if image is reasonably sized (not icons)
-                    width = img.get('width')
-                    height = img.get('height')
-                    if width and height:
-                        try:
-                            w = int(width)
-                            h = int(height)
-                            if w >= 200 and h >= 150:  # Minimum size for article images
-                                print(f"Found suitable img tag: {full_url}")
-                                image_cache[url] = full_url
-                                return full_url
-                        except:
-                            pass
-                    else:
-                        # If no dimensions, check if it looks like a content image
-                        if 'article' in img_src.lower() or 'content' in img_src.lower() or 'photo' in img_src.lower():
-                            print(f"Found content img tag: {full_url}")
-                            image_cache[url] = full_url
-                            return full_url
-
-        print(f"No image found for {url}")
+        # Slow path: fetch the whole page for <img> heuristics (a 304 reuses the last result)
+        if not image_url and status == 200:
+            logger.debug("No image in head, fetching article page: %s", real_url)
+            status, image_url = upstream.fetch_parsed(real_url, find_article_image, timeout=8, key='image')
+
+        if image_url:
+            image_cache[key] = image_url
+            return image_url
+
+        logger.debug("No image found for %s", url)
         # Cache empty result to avoid repeated failed attempts
-        image_cache[url] = ''
+        image_cache[key] = ''
         return ''
 
+    except (upstream.CircuitOpenError, upstream.DeadlineExceeded) as e:
+        # Not the article's fault: don't cache the miss, a later request tries again
+        logger.debug("Skipping image lookup for %s: %s", url, e)
+        return ''
     except Exception as e:
-        print(f"Error getting image from {url}: {e}")
-        image_cache[url] = ''
+        logger.warning("Error getting image from %s: %s", url, e)
+        if not upstream.expired():
+            image_cache[key] = ''
         return ''
 
-# Simplified BBC scraping function
-def _get(lang, latest):
-    start = time.time()
-    response = {}
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        r = requests.get(lang, headers=headers, timeout=10)
-        response["status"] = r.status_code
+@metrics.timed('images')
+def enrich_images(articles, fallback_images, deadline=None):
+    """Resolve urlToImage for all articles in parallel within a total deadline.
 
-        if r.status_code == 200:
-            soup = BeautifulSoup(r.content, 'html.parser')
-            sections = soup.find_all('section', {'aria-labelledby': True})
+    Lookups still running when the deadline passes keep going in the background
+    and fill image_cache; those articles fall back to their listing image.
+    """
+    if deadline is None:
+        deadline = IMAGE_DEADLINE
 
-            for section in sections:
-                title_elem = section.find("h2")
-                if not title_elem:
-                    continue
+    futures = {}
+    for index, article in enumerate(articles):
+        if article.get('url'):
+            # Lookups left running after the deadline go on without it, to fill image_cache
+            futures[image_pool.submit(upstream.detached(get_article_image), article['url'])] = index
 
-                title = title_elem.get_text().strip()
-                section_news = []
+    done, _ = wait(futures, timeout=upstream.remaining(deadline))
 
-                # Find news items in this section
-                news_items = section.find_all('li')
-                for item in news_items[:5]:  # Limit to 5 per section
-                    title_link = item.find('h3 a')
-                    if not title_link:
-                        continue
+    for index, article in enumerate(articles):
+        article['urlToImage'] = fallback_images[index] or ''
+    for future, index in futures.items():
+        if future in done and future.result():
+            articles[index]['urlToImage'] = future.result()
 
-                    news_title = title_link.get_text().strip()
-                    news_link = title_link.get('href')
-                    if news_link and not news_link.startswith('http'):
-                        news_link = urljoin(lang, news_link)
+    return articles
 
-                    summary_elem = item.find('p')
-                    news_summary = summary_elem.get_text().strip() if summary_elem else ""
+# ---------------- Image modes ----------------
+# /news?images=: "listing" uses the listing page's srcset (no extra fetch), "eager"
+# resolves each article's og:image before responding, "lazy" points at /image
+# which resolves it on first hit, "none" leaves urlToImage empty
+IMAGE_MODES = ('listing', 'eager', 'lazy', 'none')
+IMAGES_MODE = os.getenv('IMAGES_MODE', 'eager').lower()
+# Display width (pixels) listing images are chosen for when /news has no width=
+LISTING_IMAGE_WIDTH = int(os.getenv('LISTING_IMAGE_WIDTH', 800))
+# Hosts /image will look up articles on, and may redirect to as a fallback
+IMAGE_ARTICLE_HOSTS = ('bbc.com', 'bbc.co.uk', 'news.google.com')
+IMAGE_FALLBACK_HOSTS = ('ichef.bbci.co.uk',)
+
+# Standard ichef.bbci.co.uk rendition widths. The width is a path segment, e.g.
+# /news/1024/branded_news/..., /ace/standard/976/... or /images/ic/1024x576/...
+ICHEF_HOST = 'ichef.bbci.co.uk'
+ICHEF_WIDTHS = (240, 320, 480, 640, 800, 976, 1024, 1536)
+ICHEF_WIDTH_PATH = re.compile(r'^(/(?:[a-z_]+/){1,2})(\d{2,4})(/)')
+ICHEF_SIZE_PATH = re.compile(r'^(/images/ic/)(\d+)x(\d+)(/)')
+MAX_DPR = 4.0
+
+def requested_image_width(width, dpr):
+    """Pixel width wanted from width= and dpr= query values, or None when neither is given.
+
+    Raises ValueError for a malformed value.
+    """
+    if not width and not dpr:
+        return None
+    if width and not (width.isdigit() and int(width) > 0):
+        raise ValueError('Invalid width. Must be a positive integer.')
+    try:
+        ratio = float(dpr) if dpr else 1.0
+    except ValueError:
+        ratio = 0.0
+    if not 0 < ratio <= MAX_DPR:
+        raise ValueError(f'Invalid dpr. Must be a number above 0 and at most {MAX_DPR:g}.')
+    return round((int(width) if width else LISTING_IMAGE_WIDTH) * ratio)
+
+def resize_image_url(url, width):
+    """Rewrite an ichef.bbci.co.uk image URL to the smallest standard rendition at
+    least `width` pixels wide. URLs are only ever scaled down, since not every
+    image exists above its published width. Other URLs come back unchanged.
+    """
+    if not url or not width:
+        return url
+    parts = urlsplit(url)
+    if parts.hostname != ICHEF_HOST:
+        return url
+    target = next((w for w in ICHEF_WIDTHS if w >= width), ICHEF_WIDTHS[-1])
+
+    match = ICHEF_SIZE_PATH.match(parts.path)
+    if match and int(match.group(2)):
+        if target >= int(match.group(2)):
+            return url
+        # Fixed-size renditions keep their aspect ratio
+        height = round(int(match.group(3)) * target / int(match.group(2)))
+        path = f"{match.group(1)}{target}x{height}{match.group(4)}{parts.path[match.end():]}"
+    else:
+        match = ICHEF_WIDTH_PATH.match(parts.path)
+        if not match or target >= int(match.group(2)):
+            return url
+        path = f"{match.group(1)}{target}{match.group(3)}{parts.path[match.end():]}"
+    return urlunsplit(parts._replace(path=path))
+
+def resize_article_images(articles, width):
+    """resize_image_url() every urlToImage in place"""
+    if width:
+        for article in articles:
+            article['urlToImage'] = resize_image_url(article.get('urlToImage'), width)
+    return articles
 
-                    img_elem = item.find('img')
-                    image_link = img_elem.get('src') if img_elem else ""
+def on_hosts(url, hosts):
+    """True if url is http(s) on one of hosts or their subdomains"""
+    parts = urlsplit(url or '')
+    host = parts.hostname or ''
+    return parts.scheme in ('http', 'https') and any(host == h or host.endswith('.' + h) for h in hosts)
+
+def choose_listing_images(listing_images, width):
+    """One URL per listing image srcset, sized for width"""
+    return [parsers.srcset_image(srcset, width) for srcset in listing_images]
+
+def lazy_image_url(host_url, article_url, fallback='', width=None):
+    """/image URL that resolves article_url's og:image when first requested"""
+    params = {'url': article_url}
+    if fallback:
+        params['fallback'] = fallback
+    if width:
+        params['width'] = width
+    return f"{host_url.rstrip('/')}/image?{urlencode(params)}"
+
+def apply_image_mode(articles, images, mode, host_url, width=None):
+    """Set urlToImage for the listing, lazy and none modes (eager goes through enrich_images)"""
+    for article, image in zip(articles, images):
+        if mode == 'listing':
+            article['urlToImage'] = resize_image_url(image, width) or ''
+        elif mode == 'lazy' and article.get('url'):
+            article['urlToImage'] = lazy_image_url(host_url, article['url'], image, width)
+        elif mode == 'lazy':
+            article['urlToImage'] = image or ''
+        else:
+            article['urlToImage'] = ''
+    return articles
 
-                    section_news.append({
-                        "title": news_title,
-                        "summary": news_summary,
-                        "news_link": news_link,
-                        "image_link": image_link
-                    })
+def parse_language_sections(response, lang, latest):
+    """Parse a BBC World Service front page into {section title: [news items]}"""
+    sections_news = {}
+    soup = BeautifulSoup(response.content, 'html.parser')
+    sections = soup.find_all('section', {'aria-labelledby': True})
 
-                if section_news:
-                    response[title] = section_news
+    for section in sections:
+        title_elem = section.find("h2")
+        if not title_elem:
+            continue
 
-                if latest:
-                    break
-        else:
-            response['status'] = 503
-            response["error"] = f"Failed to retrieve content. BBC website returned status code: {r.status_code}"
+        title = title_elem.get_text().strip()
+        section_news = []
 
-    except Exception as e:
-        response["status"] = 500
-        response["error"] = str(e)
+        # Find news items in this section
+        news_items = section.find_all('li')
+        for item in news_items[:5]:  # Limit to 5 per section
+            title_link = item.select_one('h3 a')
+            if not title_link:
+                continue
 
-    end = time.time()
-    duration = end - start
-    response["elapsed time"] = f"{duration:.3f}s"
-    response["timestamp"] = int(time.time())
-    return response
+            news_title = title_link.get_text().strip()
+            news_link = title_link.get('href')
+            if news_link and not news_link.startswith('http'):
+                news_link = urljoin(lang, news_link)
 
-def scrape_bbc_section(url, max_results=10):
-    """Scrape articles from a BBC section URL"""
-    print(f"Scraping BBC section: {url}")
-
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Accept-Encoding': 'gzip, deflate',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-    }
+            summary_elem = item.find('p')
+            news_summary = summary_elem.get_text().strip() if summary_elem else ""
 
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.content, 'html.parser')
-        articles = []
-
-        # Determine the URL pattern based on the section URL
-        if '/sport' in url:
-            url_pattern = lambda x: x and '/sport/' in x and len(x) > 20 and any(char.isdigit() for char in x)
-        elif '/news/technology' in url:
-            url_pattern = lambda x: x and ('/news/technology/' in x or '/news/articles/' in x) and len(x) > 20
-        elif '/news/science' in url:
-            url_pattern = lambda x: x and ('/news/science' in x or '/news/articles/' in x) and len(x) > 20
-        elif '/news/business' in url:
-            url_pattern = lambda x: x and ('/news/business/' in x or '/news/articles/' in x) and len(x) > 20
-        elif '/news/politics' in url:
-            url_pattern = lambda x: x and ('/news/politics/' in x or '/news/articles/' in x) and len(x) > 20
-        elif '/news/world' in url:
-            url_pattern = lambda x: x and ('/news/world/' in x or '/news/articles/' in x) and len(x) > 20
-        elif '/news/health' in url:
-            url_pattern = lambda x: x and ('/news/health/' in x or '/news/articles/' in x) and len(x) > 20
-        elif '/news/entertainment' in url:
-            url_pattern = lambda x: x and ('/news/entertainment' in x or '/news/articles/' in x) and len(x) > 20
-        else:
-            # Fallback for other sections
-            url_pattern = lambda x: x and ('/news/articles/' in x or '/sport/' in x) and len(x) > 20
+            img_elem = item.find('img')
+            image_link = img_elem.get('src') if img_elem else ""
 
-        # Find actual article links based on the section
-        article_links = soup.find_all('a', href=url_pattern)
+            section_news.append({
+                "title": news_title,
+                "summary": news_summary,
+                "news_link": news_link,
+                "image_link": image_link,
+                "image_srcset": (img_elem.get('srcset') if img_elem else "") or image_link
+            })
 
-        # If no specific pattern matches, try a broader approach
-        if not article_links:
-            article_links = soup.find_all('a', href=lambda x: x and len(x) > 30 and ('/news/' in x or '/sport/' in x) and any(char.isdigit() for char in x))
+        if section_news:
+            sections_news[title] = section_news
 
-        seen_titles = set()
-        for link in article_links:
-            if len(articles) >= max_results:
-                break
+        if latest:
+            break
 
-            href = link.get('href')
-            text = link.get_text().strip()
+    return sections_news
 
-            # Look for title in various places
-            title = ''
+def load_language_front(lang, latest):
+    """Fetch and parse a World Service front page, raising on upstream failure"""
+    status, sections_news = upstream.fetch_parsed(
+        lang, lambda r: parse_language_sections(r, lang, latest), timeout=10, key=('language', latest))
+    if status != 200:
+        raise upstream.UpstreamError(lang, status)
+    index_listing_sections(lang, sections_news)
+    return sections_news
 
-            # Check if the link itself has text
-            if text and len(text) > 10:
-                title = text
-            else:
-                # Look in parent elements for title
-                parent = link.parent
-                for _ in range(3):  # Check up to 3 levels up
-                    if parent:
-                        h3 = parent.find('h3')
-                        if h3:
-                            title = h3.get_text().strip()
-                            break
-                        span = parent.find('span')
-                        if span and len(span.get_text().strip()) > 10:
-                            title = span.get_text().strip()
-                            break
-                        p = parent.find('p')
-                        if p and len(p.get_text().strip()) > 10:
-                            title = p.get_text().strip()
-                            break
-                    parent = parent.parent if parent else None
-
-            # Skip if title is too short, already seen, or is a section header
-            if not title or len(title) <= 15 or title in seen_titles:
-                continue
+# Simplified BBC scraping function
+def _get(lang, latest):
+    start = time.time()
+    response = {}
+    try:
+        sections_news = listing_cache.get(('language', lang, latest), lambda: load_language_front(lang, latest))
+        response["status"] = 200
+        response.update(sections_news)
 
-            # Skip section headers and navigation
-            if any(skip in title.lower() for skip in ['video', 'more', 'also in', 'only from', 'insight', 'live', 'watch', 'listen']):
-                continue
+    except upstream.UpstreamError as e:
+        response['status'] = 503
+        response["error"] = f"Failed to retrieve content. BBC website returned status code: {e.status}"
 
-            seen_titles.add(title)
+    except Exception as e:
+        response["status"] = 500
+        response["error"] = str(e)
 
-            # Get full URL
-            if href.startswith('/'):
-                full_url = f"https://www.bbc.com{href}"
-            else:
-                full_url = href
-
-            # Look for summary in nearby elements
-            summary = ""
-            parent = link.parent
-            if parent:
-                p_elem = parent.find('p')
-                if p_elem:
-                    summary = p_elem.get_text().strip()
-
-            # Look for image in parent container
-            image_src = ""
-            if parent:
-                img_elem = parent.find('img')
-                if img_elem:
-                    if 'srcset' in img_elem.attrs and img_elem.attrs['srcset']:
-                        image_src = img_elem.attrs['srcset'].split(',')[0].split(' ')[0]
-                    else:
-                        image_src = img_elem.attrs.get('src', "")
+    end = time.time()
+    duration = end - start
+    response["elapsed time"] = f"{duration:.3f}s"
+    response["timestamp"] = int(time.time())
+    return response
 
-            articles.append({
-                "title": title,
-                "summary": summary,
-                "image": image_src,
-                "link": full_url
-            })
+def load_section(url):
+    """Fetch and parse a BBC section page, raising on upstream failure"""
+    logger.debug("Scraping BBC section: %s", url)
+    status, articles = upstream.fetch_parsed(url, lambda r: parsers.parse_section(r.content, url), timeout=10, key='section')
+    if status != 200:
+        raise upstream.UpstreamError(url, status)
+    index_section_articles(url, articles)
+    return articles
 
-        print(f"Found {len(articles)} articles for {url}")
+def scrape_bbc_section(url, max_results=10):
+    """Scrape articles from a BBC section URL (served from listing_cache)"""
+    try:
+        articles = listing_cache.get(('section', url), lambda: load_section(url))[:max_results]
+        logger.debug("Found %s articles for %s", len(articles), url)
         return articles
 
     except Exception as e:
-        print(f"Error scraping BBC section {url}: {e}")
+        logger.warning("Error scraping BBC section %s: %s", url, e)
         return []
 
+def load_homepage(bbc_url, latest):
+    """Fetch and parse the BBC homepage, raising on upstream failure"""
+    status, sections_news = upstream.fetch_parsed(
+        bbc_url, lambda r: parsers.parse_homepage(r.content, latest), timeout=10, key=('homepage', latest))
+    if status != 200:
+        raise upstream.UpstreamError(bbc_url, status)
+    index_listing_sections('homepage', sections_news)
+    return sections_news
+
 def get_eng(bbc_url='https://www.bbc.com/', latest=False):
     response = {}
     start = time.time()
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        r = requests.get(bbc_url, headers=headers, timeout=10)
-
-        if r.status_code != 200:
+        try:
+            sections_news = listing_cache.get(('homepage', bbc_url, latest), lambda: load_homepage(bbc_url, latest))
+        except upstream.UpstreamError as e:
             response["status"] = 503
-            response["error"] = f"Failed to retrieve content. BBC website returned status code: {r.status_code}"
+            response["error"] = f"Failed to retrieve content. BBC website returned status code: {e.status}"
             return response
 
-        soup = BeautifulSoup(r.content, 'html.parser')
-        response["status"] = r.status_code
-
-        # Find all sections
-        sections = soup.find_all(['section', 'div'], {'data-testid': lambda x: x and x.endswith('-section')})
-
-        for section in sections:
-            # Get section title
-            title_elem = section.find(['h2', 'div'], {'data-testid': lambda x: x and x.endswith('-title-wrapper')})
-            if title_elem:
-                title_elem = title_elem.find('h2') if title_elem.name != 'h2' else title_elem
-                title_text = title_elem.get_text().strip() if title_elem else "Latest"
-            else:
-                title_text = "Latest"
-
-            sec_news = []
-
-            # Find all news cards in this section
-            cards = section.find_all('div', {'data-testid': lambda x: x and x.endswith('-card')})
-
-            for card in cards[:8]:  # Limit to 8 per section
-                # Extract title
-                heading_elem = card.find('h2', {'data-testid': 'card-headline'})
-                heading_text = heading_elem.get_text().strip() if heading_elem else ""
-
-                # Extract summary
-                summary_elem = card.find('p', {'data-testid': 'card-description'})
-                summary_text = summary_elem.get_text().strip() if summary_elem else ""
-
-                # Extract image
-                img_elem = card.find('img')
-                image_src = ""
-                if img_elem:
-                    if 'srcset' in img_elem.attrs and img_elem.attrs['srcset']:
-                        image_src = img_elem.attrs['srcset'].split(',')[0].split(' ')[0]
-                    else:
-                        image_src = img_elem.attrs.get('src', "")
-
-                # Extract link
-                link_elem = card.find('a')
-                news_link = ""
-                if link_elem and link_elem.get('href'):
-                    href = link_elem.get('href')
-                    if href.startswith('/'):
-                        news_link = f"https://www.bbc.com{href}"
-                    else:
-                        news_link = href
-
-                if heading_text:  # Only add if we have a title
-                    sec_news.append({
-                        "title": heading_text,
-                        "summary": summary_text,
-                        "image_link": image_src,
-                        "news_link": news_link
-                    })
-
-            if sec_news:
-                response[title_text] = sec_news
-
-            if latest:
-                break
+        response["status"] = 200
+        response.update(sections_news)
 
         # Filter out empty sections
         response = {k: v for k, v in response.items() if v}
@@ -535,6 +684,135 @@ def get_eng(bbc_url='https://www.bbc.com/', latest=False):
     return response
 
 
+# ================ HTTP CACHING ================
+
+# Cache-Control sent with successful responses, per endpoint
+CACHE_CONTROL = {
+    'news': os.getenv('NEWS_CACHE_CONTROL', 'public, max-age=60, stale-while-revalidate=300'),
+    'extract': os.getenv('EXTRACT_CACHE_CONTROL', 'public, max-age=3600, stale-while-revalidate=86400'),
+    'languages': os.getenv('LANGUAGES_CACHE_CONTROL', 'public, max-age=86400, stale-while-revalidate=604800'),
+    'image': os.getenv('IMAGE_CACHE_CONTROL', 'public, max-age=86400'),
+}
+# Cache-Control for responses built from an outdated snapshot while BBC is failing
+STALE_CACHE_CONTROL = os.getenv('STALE_CACHE_CONTROL', 'no-cache')
+
+def cache_control(endpoint, payload):
+    return STALE_CACHE_CONTROL if payload.get('stale') else CACHE_CONTROL[endpoint]
+
+def response_etag(endpoint, payload):
+    """Stable ETag for an endpoint payload.
+
+    For /news only the article set counts (url, title, description, image), so
+    per-request fields such as publishedAt don't change the tag between polls.
+    """
+    if endpoint == 'news':
+        source = [[a['url'], a['title'], a['description'], a['urlToImage']] for a in payload['articles']]
+    else:
+        source = payload
+    return hashlib.sha1(json.dumps(source, sort_keys=True).encode('utf-8')).hexdigest()
+
+@metrics.timed('serialize')
+def cacheable_json(endpoint, payload):
+    """jsonify() with ETag and Cache-Control; answers a matching If-None-Match with 304"""
+    response = jsonify(payload)
+    # A 304 carries the same (weak once compressed) ETag and Vary as the 200 it stands for
+    response.set_etag(response_etag(endpoint, payload), weak=compress_encoding(response) is not None)
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = cache_control(endpoint, payload)
+    return response.make_conditional(request)
+
+# ================ RESPONSE COMPRESSION ================
+
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 4))
+COMPRESS_MIMETYPES = {'application/json'}
+
+def choose_encoding(accept_encoding):
+    """Pick "br" or "gzip" from an Accept-Encoding header, or None"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+def compress_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL)
+
+def compress_encoding(response):
+    """Encoding compress_response() applies to a JSON response for this request, or None"""
+    if len(response.get_data()) < COMPRESS_MIN_SIZE:
+        return None
+    return choose_encoding(request.headers.get('Accept-Encoding'))
+
+@app.after_request
+def compress_response(response):
+    """Compress JSON responses above COMPRESS_MIN_SIZE as negotiated by Accept-Encoding"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.mimetype not in COMPRESS_MIMETYPES or 'Content-Encoding' in response.headers):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = compress_encoding(response)
+    if encoding is None:
+        return response
+
+    with metrics.Stage('compress'):
+        response.set_data(compress_body(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    # The compressed bytes differ, so the tag becomes weak (If-None-Match still matches)
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+# ================ METRICS ================
+
+metrics.registry.add_collector(metrics.cache_collector(
+    [image_cache, url_cache, content_cache, listing_cache, upstream._parsed],
+    [image_flight, url_flight, content_flight]))
+metrics.registry.add_collector(metrics.breaker_collector(upstream.breakers))
+metrics.registry.add_collector(metrics.governor_collector(upstream.governors, upstream.PRIORITY_NAMES))
+
+def metrics_endpoint():
+    """Label for a request: its route rule, so URLs with parameters don't add series"""
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_start = time.perf_counter()
+    metrics.http_in_flight.inc(metrics_endpoint())
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    if 'metrics_start' in g:
+        metrics.http_in_flight.dec(metrics_endpoint())
+
+@app.after_request
+def record_request_metrics(response):
+    if 'metrics_start' in g:
+        endpoint = metrics_endpoint()
+        metrics.http_seconds.observe(endpoint, value=time.perf_counter() - g.metrics_start)
+        metrics.http_responses.inc(endpoint, str(response.status_code))
+    return response
+
+@app.route('/metrics')
+def metrics_page():
+    return Response(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # ================ ENDPOINTS ================
 
 @app.route("/")
@@ -573,7 +851,261 @@ def sitemap():
     return send_from_directory(app.static_folder, "sitemap.xml", mimetype='application/xml')
 
 
+def index_section_articles(section_url, articles):
+    """Add scraped section articles to the search index"""
+    for a in articles:
+        search_index.add(a.get('link'), a.get('title'), a.get('summary'), a.get('image_srcset') or a.get('image'),
+                         source=section_url)
+
+def index_listing_sections(source, sections_news):
+    """Add homepage/language-front sections ({title: [items]}) to the search index"""
+    for section_name, items in sections_news.items():
+        for a in items:
+            search_index.add(a.get('news_link'), a.get('title'), a.get('summary'), a.get('image_srcset') or a.get('image_link'),
+                             source=source, tag=section_name.lower())
+
+def index_cached_listings():
+    """Index listings loaded from the persistent cache backend at startup"""
+    for key, value in listing_cache.items():
+        if key[0] == 'section':
+            index_section_articles(key[1], value)
+        elif key[0] == 'homepage':
+            index_listing_sections('homepage', value)
+        elif key[0] == 'language':
+            index_listing_sections(key[1], value)
+
+def search_to_gnews(query, topic, max_results, section_url=None):
+    """Answer English /news?q= from the search index (without images).
+
+    With a topic, matches from that topic's section come first; if there are
+    none, the homepage and every topic section are searched, like the general
+    fallback, and those hits keep their own tags. World Service fronts share
+    the index but are never searched here.
+    """
+    hits = search_index.search(query, limit=max_results, source=section_url) if section_url else []
+    in_topic = bool(hits) and bool(topic)
+    if not hits:
+        hits = search_index.search(query, limit=max_results, source=english_sources)
+
+    articles = []
+    listing_images = []
+    for hit in hits:
+        tag = topic.lower() if in_topic else (hit['tag'] or 'general')
+        articles.append({
+            'title': hit['title'],
+            'description': hit['summary'] or '',
+            'url': hit['url'],
+            'urlToImage': '',
+            'publishedAt': datetime.now(pytz.timezone("Asia/Dhaka")).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'author': 'BBC News',
+            'source': 'BBC News',
+            'category': topic.lower() if in_topic else 'general',
+            'region': 'global',
+            'tags': [tag],
+            'readTime': len(hit['summary'] or '') // 200 + 1,
+            'aiSummary': ''
+        })
+        listing_images.append(hit['image'] or '')
+    return articles, listing_images
+
+@metrics.timed('listing')
+def collect_news(query, topic, max_results):
+    """Listing articles for /news in GNews format, before image enrichment.
+
+    Returns (articles, listing_images), or None when the BBC homepage could not
+    be fetched. Listing images are srcset strings (see choose_listing_images()).
+    """
+    if query:
+        # Make sure the listing this request covers is indexed (a cache hit after the first time)
+        section_url = None
+        if topic and topic != 'general':
+            section_url = url_mapping.get(topic, 'https://www.bbc.com/news')
+            scrape_bbc_section(section_url)
+        else:
+            get_eng(latest=False)
+        return search_to_gnews(query, topic, max_results, section_url)
+
+    # Use direct BBC scraping for category-based news to ensure proper categorization
+    if topic and topic != 'general':
+        section_url = url_mapping.get(topic, 'https://www.bbc.com/news')
+
+        logger.debug("Topic: %s, URL: %s", topic, section_url)
+        try:
+            # Scrape the specific BBC section
+            section_data = scrape_bbc_section(section_url, max_results)
+            logger.debug("Section articles scraped: %s", len(section_data))
+
+            # Transform to GNews format
+            articles, listing_images = section_to_gnews(section_data, topic, query)
+            logger.debug("Articles created: %s", len(articles))
+            if articles:
+                return articles, listing_images
+
+        except Exception as scrape_e:
+            logger.warning("Scraping failed for topic %s: %s, falling back to general scraping", topic, scrape_e)
+
+    # Fallback: For general or unknown topics, use the existing scraping method
+    bbc_data = get_eng(latest=False)  # Get all sections
+
+    if bbc_data.get('status') != 200:
+        return None
+
+    # Transform BBC data to GNews format
+    return homepage_to_gnews(bbc_data, query, topic, max_results)
+
+def load_edition(edition):
+    """Listing items of one edition as (source, [(section, item)]), or None on failure"""
+    if edition == 'english':
+        source, data = 'homepage', get_eng(latest=False)
+    else:
+        source, data = urls[edition], _get(urls[edition], False)
+    if data.get('status') != 200:
+        logger.warning("Edition %s failed: %s", edition, data.get('error'))
+        return None
+    return source, [(section, item) for section, items in data.items() if isinstance(items, list) for item in items]
+
+@metrics.timed('listing')
+def collect_language_news(query, editions, max_results):
+    """/news articles from one or more language editions, before image enrichment.
+
+    Every edition is fetched concurrently (each through listing_cache, so a warm
+    edition costs nothing) within one shared LANGUAGE_DEADLINE; editions that miss
+    it are left out and keep loading in the background. Articles are interleaved
+    across editions in the requested order. Returns None when every edition failed.
+    """
+    # Each worker runs in a copy of this context, so stale snapshots it serves are reported
+    futures = [language_pool.submit(contextvars.copy_context().run, load_edition, edition) for edition in editions]
+    done, _ = wait(futures, timeout=upstream.remaining(LANGUAGE_DEADLINE))
+
+    per_edition = []
+    for edition, future in zip(editions, futures):
+        loaded = future.result() if future in done else None
+        if loaded is None:
+            continue
+        source, items = loaded
+        if query:
+            tags = {item.get('news_link'): section for section, item in items}
+            items = [(tags.get(doc['url'], doc['tag']),
+                      {'title': doc['title'], 'summary': doc['summary'], 'news_link': doc['url'], 'image_link': doc['image']})
+                     for doc in search_index.search(query, limit=max_results, source=source)]
+        per_edition.append((edition, items))
+
+    if not per_edition:
+        return None
+
+    articles = []
+    listing_images = []
+    seen = set()
+    for row in range(max(len(items) for _, items in per_edition)):
+        for edition, items in per_edition:
+            if row >= len(items) or len(articles) >= max_results:
+                continue
+            section, item = items[row]
+            key = article_key(item.get('news_link'))
+            if not item.get('title') or (key and key in seen):
+                continue
+            seen.add(key)
+            articles.append({
+                'title': item.get('title') or '',
+                'description': item.get('summary') or '',
+                'url': item.get('news_link') or '',
+                'urlToImage': '',
+                'publishedAt': datetime.now(pytz.timezone("Asia/Dhaka")).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'author': 'BBC News',
+                'source': 'BBC News',
+                'category': 'general',
+                'region': 'global',
+                'language': edition,
+                'tags': [section.lower()],
+                'readTime': len(item.get('summary') or '') // 200 + 1,
+                'aiSummary': ''
+            })
+            listing_images.append(item.get('image_srcset') or item.get('image_link') or '')
+    return articles, listing_images
+
+# Streaming formats for /news?stream=
+NEWS_STREAM_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream',
+}
+
+def format_news_event(event, payload, stream_format):
+    """Encode one /news stream event as an NDJSON line or a Server-Sent Event"""
+    if stream_format == 'sse':
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    return json.dumps({'type': event, **payload}) + '\n'
+
+def parse_max_results(value):
+    """Article count for a /news max_results parameter"""
+    try:
+        max_results = int(value)
+    except ValueError:
+        max_results = 0
+    if max_results <= 0:
+        raise ValueError('Invalid max_results. Must be a positive integer.')
+    return max_results
+
+def request_timeout(value):
+    """Seconds of upstream budget for a request's timeout_ms parameter ('' for the default)"""
+    if not value:
+        return REQUEST_TIMEOUT_MS / 1000 if REQUEST_TIMEOUT_MS > 0 else None
+    try:
+        timeout_ms = int(value)
+    except ValueError:
+        timeout_ms = 0
+    if timeout_ms <= 0:
+        raise ValueError('Invalid timeout_ms. Must be a positive integer.')
+    return min(timeout_ms, REQUEST_TIMEOUT_MAX_MS) / 1000
+
+def request_deadline(view):
+    """Run a view's upstream calls as foreground work bounded by the request's timeout_ms
+    (see upstream.deadline() and upstream.priority())"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            timeout = request_timeout(request.args.get('timeout_ms', ''))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        with upstream.deadline(timeout), upstream.priority(upstream.FOREGROUND):
+            return view(*args, **kwargs)
+    return wrapper
+
+def stream_news(articles, listing_images, stream_format, resolve_images=True, image_width=None, timeout=None):
+    """Emit every article right away, then urlToImage patches as og:image lookups finish.
+
+    Without resolve_images the articles are sent with the urlToImage they already have.
+    `timeout` bounds the lookups, as the response body is produced after the view returns.
+    """
+    for index, article in enumerate(articles):
+        if resolve_images:
+            article['urlToImage'] = resize_image_url(listing_images[index], image_width) or ''
+        yield format_news_event('article', {'index': index, 'article': article}, stream_format)
+
+    if not resolve_images:
+        yield format_news_event('done', {'count': len(articles)}, stream_format)
+        return
+
+    # The body is produced after the view returned, outside its deadline and priority
+    with upstream.priority(upstream.FOREGROUND):
+        futures = {image_pool.submit(upstream.detached(get_article_image), a['url']): i
+                   for i, a in enumerate(articles) if a.get('url')}
+    try:
+        # A spent budget (0.0) waits for nothing; only None means no request deadline
+        wait_for = IMAGE_DEADLINE if timeout is None else min(IMAGE_DEADLINE, timeout)
+        for future in as_completed(futures, timeout=wait_for):
+            index = futures[future]
+            image_url = resize_image_url(future.result(), image_width)
+            if image_url and image_url != articles[index]['urlToImage']:
+                patch = {'index': index, 'url': articles[index]['url'], 'urlToImage': image_url}
+                yield format_news_event('image', patch, stream_format)
+    except FuturesTimeout:
+        # Unfinished lookups keep running in the background and fill image_cache
+        pass
+
+    yield format_news_event('done', {'count': len(articles)}, stream_format)
+
 @app.route('/news', methods=['GET', 'OPTIONS'])
+@request_deadline
 def news():
     if request.method == 'OPTIONS':
         return '', 200
@@ -584,126 +1116,224 @@ def news():
         topic = request.args.get('topic', '').lower()
         country = request.args.get('country', 'GB')  # Default to GB for BBC
         language = request.args.get('language', 'en')
-        max_results = int(request.args.get('max_results', 10))
-
-        # Use direct BBC scraping for category-based news to ensure proper categorization
-        if topic and topic != 'general':
-            # Map topic to specific BBC section URLs for accurate categorization
-            url_mapping = {
-                'technology': 'https://www.bbc.com/news/technology',
-                'science': 'https://www.bbc.com/news/science_and_environment',
-                'business': 'https://www.bbc.com/news/business',
-                'politics': 'https://www.bbc.com/news/politics',
-                'world': 'https://www.bbc.com/news/world',
-                'health': 'https://www.bbc.com/news/health',
-                'entertainment': 'https://www.bbc.com/news/entertainment_and_arts',
-                'sports': 'https://www.bbc.com/sport',
-                'geopolitics': 'https://www.bbc.com/news/world',
-                'stock_market': 'https://www.bbc.com/news/business',
-                'food': 'https://www.bbc.com/news/world',
-                'defense': 'https://www.bbc.com/news/world',
-            }
-
-            section_url = url_mapping.get(topic, 'https://www.bbc.com/news')
-
-            print(f"Topic: {topic}, URL: {section_url}")
-            try:
-                # Scrape the specific BBC section
-                section_data = scrape_bbc_section(section_url, max_results)
-                print(f"Section articles scraped: {len(section_data)}")
-
-                # Transform to GNews format
-                articles = []
-                for article_data in section_data:
-                    article = {
-                        'title': article_data.get('title', ''),
-                        'description': article_data.get('summary', ''),
-                        'url': article_data.get('link', ''),
-                        'urlToImage': get_article_image(article_data.get('link', '')),
-                        'publishedAt': datetime.now(pytz.timezone("Asia/Dhaka")).strftime('%Y-%m-%dT%H:%M:%SZ'),
-                        'author': 'BBC News',
-                        'source': 'BBC News',
-                        'category': topic,
-                        'region': 'global',
-                        'tags': [topic.lower()],
-                        'readTime': len(article_data.get('summary') or '') // 200 + 1,
-                        'aiSummary': ''
-                    }
-
-                    # Apply query filter if specified
-                    if query:
-                        search_text = (article['title'] + ' ' + article['description']).lower()
-                        if query.lower() not in search_text:
-                            continue
-
-                    articles.append(article)
-
-                print(f"Articles created: {len(articles)}")
-                if articles:
-                    return jsonify({'articles': articles})
-
-            except Exception as scrape_e:
-                print(f"Scraping failed for topic {topic}: {scrape_e}, falling back to general scraping")
-
-        # Fallback: For general or unknown topics, use the existing scraping method
-        bbc_data = get_eng(False)  # Get all sections
-
-        if bbc_data.get('status') != 200:
+        max_results = parse_max_results(request.args.get('max_results', '10'))
+        # Optional streaming mode: "ndjson" or "sse"
+        stream_format = request.args.get('stream', '').lower()
+        if stream_format and stream_format not in NEWS_STREAM_MIMETYPES:
+            return jsonify({'error': 'Invalid stream. Must be ndjson or sse.'}), 400
+        # How urlToImage is filled: listing, eager, lazy or none
+        images_mode = request.args.get('images', IMAGES_MODE).lower()
+        if images_mode not in IMAGE_MODES:
+            return jsonify({'error': 'Invalid images. Must be listing, eager, lazy or none.'}), 400
+        # Image width in pixels (width= times dpr=), or None to leave image URLs as they are
+        try:
+            image_width = requested_image_width(request.args.get('width', ''), request.args.get('dpr', ''))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        editions = parse_languages(language)[:LANGUAGE_MAX]
+        # Listing snapshots served from cache because BBC could not be reached
+        stale_snapshots = track_stale()
+
+        if editions == ['english']:
+            collected = collect_news(query, topic, max_results)
+        else:
+            collected = collect_language_news(query, editions, max_results)
+        if collected is None:
+            if upstream.expired():
+                return jsonify({'error': 'Request deadline exceeded'}), 504
             return jsonify({'error': 'Failed to fetch BBC news'}), 500
 
-        # Transform BBC data to GNews format
-        articles = transform_bbc_to_gnews_format(bbc_data, query, topic, max_results)
-
+        articles, listing_images = collected
         if not articles:
             return jsonify({'error': 'No articles found'}), 404
 
-        return jsonify({'articles': articles})
-
-        # Fallback: For general or unknown topics, use the existing scraping method
-        bbc_data = get_eng(False)  # Get all sections
-
-        if bbc_data.get('status') != 200:
-            return jsonify({'error': 'Failed to fetch BBC news'}), 500
-
-        # Transform BBC data to GNews format
-        articles = transform_bbc_to_gnews_format(bbc_data, query, topic, max_results)
+        listing_images = choose_listing_images(listing_images, image_width or LISTING_IMAGE_WIDTH)
+        if images_mode != 'eager':
+            apply_image_mode(articles, listing_images, images_mode, request.host_url, image_width)
 
-        if not articles:
-            return jsonify({'error': 'No articles found'}), 404
+        if stream_format:
+            chunks = stream_news(articles, listing_images, stream_format, resolve_images=images_mode == 'eager',
+                                 image_width=image_width, timeout=upstream.remaining())
+            return Response(chunks, mimetype=NEWS_STREAM_MIMETYPES[stream_format], headers={'Cache-Control': 'no-cache'})
 
-        return jsonify({'articles': articles})
+        if images_mode == 'eager':
+            resize_article_images(enrich_images(articles, listing_images), image_width)
+        payload = {'articles': articles}
+        if stale_snapshots:
+            payload['stale'] = True
+        return cacheable_json('news', payload)
 
     except ValueError as e:
         if 'max_results' in str(e):
-            return jsonify({'error': 'Invalid max_results. Must be a positive integer.'}), 400
+            return jsonify({'error': str(e)}), 400
         return jsonify({'error': str(e)}), 500
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/image', methods=['GET'])
+@request_deadline
+def image():
+    """Redirect to an article's og:image, resolved on first request and then cached"""
+    url = request.args.get('url', '')
+    if not on_hosts(url, IMAGE_ARTICLE_HOSTS):
+        return jsonify({'error': 'url must be a BBC or Google News article URL'}), 400
+    try:
+        image_width = requested_image_width(request.args.get('width', ''), request.args.get('dpr', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    image_url = get_article_image(url)
+    if not image_url:
+        # Listing image passed along by images=lazy, used when the article has none
+        fallback = request.args.get('fallback', '')
+        image_url = fallback if on_hosts(fallback, IMAGE_FALLBACK_HOSTS) else ''
+    if not image_url:
+        return jsonify({'error': 'No image found'}), 404
+
+    response = redirect(resize_image_url(image_url, image_width), code=302)
+    response.headers['Cache-Control'] = CACHE_CONTROL['image']
+    return response
+
 @app.route('/extract', methods=['GET'])
+@request_deadline
 def extract():
     """Extract article content and image from URL (same as GNews)"""
     try:
         url = request.args.get('url')
         if not url:
             return jsonify({'error': 'URL parameter required'}), 400
+        try:
+            image_width = requested_image_width(request.args.get('width', ''), request.args.get('dpr', ''))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
         # Extract content from BBC article
-        content_data = extract_bbc_article_content(url)
+        try:
+            content_data = extract_bbc_article_content(url)
+        except Exception as e:
+            # Failures get no ETag or Cache-Control, so nothing caches them
+            return jsonify({'error': str(e)}), extract_error_status(e)
+        if image_width:
+            # Copy, so the cached result keeps the original image URL
+            content_data = dict(content_data, image=resize_image_url(content_data.get('image'), image_width))
 
-        return jsonify(content_data)
+        return cacheable_json('extract', content_data)
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/extract/batch', methods=['GET', 'POST'])
+def extract_batch():
+    """Extract many articles concurrently, streaming one NDJSON line per URL as it completes.
+
+    URLs come from a JSON body {"urls": [...]} or repeated ?url= parameters.
+    URLs still running when the batch budget (?timeout_ms=, else EXTRACT_BATCH_TIMEOUT)
+    runs out get an error line.
+    """
+    body = request.get_json(silent=True) or {}
+    batch_urls = body.get('urls') if isinstance(body, dict) else None
+    if not isinstance(batch_urls, list):
+        batch_urls = request.args.getlist('url')
+
+    # Drop repeats and blanks, keeping order
+    batch_urls = list(dict.fromkeys(u for u in batch_urls if isinstance(u, str) and u))
+    if not batch_urls:
+        return jsonify({'error': 'At least one URL is required'}), 400
+    if len(batch_urls) > EXTRACT_BATCH_MAX:
+        return jsonify({'error': f'At most {EXTRACT_BATCH_MAX} URLs per batch'}), 400
+    try:
+        image_width = requested_image_width(request.args.get('width', ''), request.args.get('dpr', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        timeout_ms = request.args.get('timeout_ms', '')
+        budget = request_timeout(timeout_ms) if timeout_ms else EXTRACT_BATCH_TIMEOUT
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    with upstream.deadline(budget), upstream.priority(upstream.FOREGROUND):
+        futures = {extract_pool.submit(contextvars.copy_context().run, extract_bbc_article_content, u): u
+                   for u in batch_urls}
+    deadline = time.time() + budget
+
+    def generate():
+        pending = set(futures)
+        try:
+            for future in as_completed(futures, timeout=max(0.0, deadline - time.time())):
+                pending.discard(future)
+                try:
+                    result = {'url': futures[future], **future.result()}
+                    if image_width:
+                        result['image'] = resize_image_url(result.get('image'), image_width)
+                except Exception as e:
+                    result = {'url': futures[future], 'error': str(e)}
+                yield json.dumps(result) + '\n'
+        except FuturesTimeout:
+            for future in pending:
+                yield json.dumps({'url': futures[future], 'error': 'Timed out'}) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def section_to_gnews(section_data, topic, query):
+    """Transform scraped section articles to GNews format (without images).
+
+    Returns the articles and, in the same order, their listing images.
+    """
+    articles = []
+    listing_images = []
+    seen = set()
+    for article_data in section_data:
+        key = article_key(article_data.get('link'))
+        if key and key in seen:
+            continue
+        article = {
+            'title': article_data.get('title', ''),
+            'description': article_data.get('summary', ''),
+            'url': article_data.get('link', ''),
+            'urlToImage': '',
+            'publishedAt': datetime.now(pytz.timezone("Asia/Dhaka")).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'author': 'BBC News',
+            'source': 'BBC News',
+            'category': topic,
+            'region': 'global',
+            'tags': [topic.lower()],
+            'readTime': len(article_data.get('summary') or '') // 200 + 1,
+            'aiSummary': ''
+        }
+
+        # Apply query filter if specified
+        if query:
+            search_text = (article['title'] + ' ' + article['description']).lower()
+            if query.lower() not in search_text:
+                continue
+
+        articles.append(article)
+        listing_images.append(article_data.get('image_srcset') or article_data.get('image', ''))
+        seen.add(key)
+
+    return articles, listing_images
+
 def transform_bbc_to_gnews_format(bbc_data, query, topic, max_results):
     """Transform BBC API response to GNews article format"""
+    articles, listing_images = homepage_to_gnews(bbc_data, query, topic, max_results)
+    return enrich_images(articles, choose_listing_images(listing_images, LISTING_IMAGE_WIDTH))
+
+def homepage_to_gnews(bbc_data, query, topic, max_results):
+    """Transform get_eng() sections to GNews format (without images).
+
+    Returns the articles and, in the same order, their listing images.
+    """
     articles = []
+    listing_images = []
 
     # Filter out non-section keys
     relevant_sections = [s for s in bbc_data.keys() if isinstance(bbc_data[s], list)]
 
     article_count = 0
+    # A story listed in several sections is kept once, under the first of them
+    seen = set()
 
     for section_name in relevant_sections:
         if article_count >= max_results:
@@ -720,13 +1350,16 @@ def transform_bbc_to_gnews_format(bbc_data, query, topic, max_results):
             # Skip articles with no title
             if not bbc_article.get('title'):
                 continue
+            key = article_key(bbc_article.get('news_link'))
+            if key and key in seen:
+                continue
 
             # Transform to GNews format
             article = {
                 'title': bbc_article.get('title') or '',
                 'description': bbc_article.get('summary') or '',
                 'url': bbc_article.get('news_link') or '',
-                'urlToImage': get_article_image(bbc_article.get('news_link') or ''),
+                'urlToImage': '',
                 'publishedAt': datetime.now(pytz.timezone("Asia/Dhaka")).strftime('%Y-%m-%dT%H:%M:%SZ'),
                 'author': 'BBC News',
                 'source': 'BBC News',
@@ -744,74 +1377,100 @@ def transform_bbc_to_gnews_format(bbc_data, query, topic, max_results):
                     continue
 
             articles.append(article)
+            listing_images.append(bbc_article.get('image_srcset') or bbc_article.get('image_link') or '')
+            seen.add(key)
             article_count += 1
 
-    return articles
-
-def extract_bbc_article_content(url):
-    """Extract full article content and main image from BBC article URL"""
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        }
-
-        response = requests.get(url, headers=headers, timeout=15)
-
-        if response.status_code != 200:
-            return {'content': '', 'image': ''}
-
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        # Extract main image
-        main_image = ''
-        og_image = soup.find('meta', property='og:image')
-        if og_image and og_image.get('content'):
-            main_image = og_image['content']
-
-        # Extract article content
-        content_parts = []
-
-        # Try different content selectors for BBC articles
-        content_selectors = [
-            'div[data-component="text-block"] p',
-            'div[data-component="text"] p',
-            '.article__body p',
-            '.story-body p',
-            '.story-body__inner p',
-            '[data-component="text-block"] p',
-        ]
+    return articles, listing_images
+
+def parse_article_content(response):
+    """Parse the body paragraphs and main image out of a BBC article page"""
+    soup = BeautifulSoup(response.content, 'html.parser')
+
+    # Extract main image
+    main_image = ''
+    og_image = soup.find('meta', property='og:image')
+    if og_image and og_image.get('content'):
+        main_image = og_image['content']
+
+    # Extract article content
+    content_parts = []
+
+    # Try different content selectors for BBC articles
+    content_selectors = [
+        'div[data-component="text-block"] p',
+        'div[data-component="text"] p',
+        '.article__body p',
+        '.story-body p',
+        '.story-body__inner p',
+        '[data-component="text-block"] p',
+    ]
+
+    for selector in content_selectors:
+        paragraphs = soup.select(selector)
+        if paragraphs:
+            content_parts.extend([p.get_text().strip() for p in paragraphs if p.get_text().strip()])
+            break
 
-        for selector in content_selectors:
-            paragraphs = soup.select(selector)
-            if paragraphs:
-                content_parts.extend([p.get_text().strip() for p in paragraphs if p.get_text().strip()])
-                break
+    # Fallback: look for any paragraph in main content area
+    if not content_parts:
+        main_content = soup.find('main') or soup.find('article') or soup.find('div', class_='article')
+        if main_content:
+            paragraphs = main_content.find_all('p')
+            content_parts = [p.get_text().strip() for p in paragraphs if p.get_text().strip()]
+
+    # Format as HTML
+    if content_parts:
+        html_content = '<div>' + ''.join([f'<p>{p}</p>' for p in content_parts]) + '</div>'
+    else:
+        html_content = '<p>The full article content is currently inaccessible. This could be due to access restrictions or technical issues. For the complete story, please visit the original source.</p>'
+
+    return {
+        'content': html_content,
+        'image': main_image
+    }
 
-        # Fallback: look for any paragraph in main content area
-        if not content_parts:
-            main_content = soup.find('main') or soup.find('article') or soup.find('div', class_='article')
-            if main_content:
-                paragraphs = main_content.find_all('p')
-                content_parts = [p.get_text().strip() for p in paragraphs if p.get_text().strip()]
+def extract_bbc_article_content(url):
+    """Extract full article content and main image from BBC article URL (raises on failure)"""
+    key = article_key(url)
+    cached_content = content_cache.get(key)
+    if cached_content is not None:
+        return cached_content
 
-        # Format as HTML
-        if content_parts:
-            html_content = '<div>' + ''.join([f'<p>{p}</p>' for p in content_parts]) + '</div>'
-        else:
-            html_content = '<p>The full article content is currently inaccessible. This could be due to access restrictions or technical issues. For the complete story, please visit the original source.</p>'
+    return content_flight.do(key, lambda: fetch_article_content(url))
 
-        return {
-            'content': html_content,
-            'image': main_image
-        }
+def fetch_article_content(url):
+    """Uncached article fetch and extraction behind extract_bbc_article_content().
 
+    Raises (UpstreamError for a non-200 page) instead of returning placeholder
+    content, so failures are neither cached nor served as articles.
+    """
+    try:
+        status, content_data = upstream.fetch_parsed(url, parse_article_content, timeout=15, key='content')
+    except (upstream.CircuitOpenError, upstream.UpstreamBusy, upstream.DeadlineExceeded):
+        # Not the article's fault
+        raise
     except Exception as e:
-        print(f"Error extracting BBC article content: {e}")
-        return {
-            'content': '<p>Unable to extract article content. Please visit the original BBC article for the full story.</p>',
-            'image': ''
-        }
+        if upstream.expired():
+            # Cut short by the deadline (e.g. a read timeout it clamped)
+            raise upstream.DeadlineExceeded(url) from e
+        logger.warning("Error extracting BBC article content: %s", e)
+        raise
+    if status != 200:
+        raise upstream.UpstreamError(url, status)
+
+    content_cache.set(article_key(url), content_data, negative=False)
+    search_index.add_body(url, content_data['content'])
+    return content_data
+
+def extract_error_status(error):
+    """Status of an /extract response for a failed extraction: 504 once the deadline
+    passed, 503 while the host is held back, 502 for any other upstream failure"""
+    if isinstance(error, upstream.DeadlineExceeded):
+        return 504
+    if isinstance(error, (upstream.CircuitOpenError, upstream.UpstreamBusy)):
+        return 503
+    return 502
 
 # Remove log endpoints that require PIN and file access
 
@@ -834,7 +1493,66 @@ def languages():
             for code, url in urls.items()
         ]
     }
-    return jsonify(response)
+    return cacheable_json('languages', response)
+
+# ================ BACKGROUND WARM-UP ================
+
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+WARMUP_CONCURRENCY = int(os.getenv('WARMUP_CONCURRENCY', 2))
+WARMUP_JITTER = float(os.getenv('WARMUP_JITTER', 0.1))
+# Seconds to block startup on the first warm-up pass (0 = warm up in the background)
+WARMUP_TIMEOUT = float(os.getenv('WARMUP_TIMEOUT', 0))
+WARMUP_SECTION_INTERVAL = int(os.getenv('WARMUP_SECTION_INTERVAL', 300))
+WARMUP_HOMEPAGE_INTERVAL = int(os.getenv('WARMUP_HOMEPAGE_INTERVAL', 120))
+WARMUP_LANGUAGE_INTERVAL = int(os.getenv('WARMUP_LANGUAGE_INTERVAL', 900))
+# Comma-separated language editions from `urls` to keep warm, or "all"
+WARMUP_LANGUAGES = os.getenv('WARMUP_LANGUAGES', '')
+# How many articles per listing get their og:image resolved ahead of time (0 = none)
+WARMUP_IMAGES = int(os.getenv('WARMUP_IMAGES', 10))
+
+warmup_scheduler = WarmupScheduler(max_concurrency=WARMUP_CONCURRENCY, jitter=WARMUP_JITTER)
+
+def prefetch_images(links):
+    """Resolve og:images for the first WARMUP_IMAGES links so requests hit image_cache"""
+    for link in dedupe_links(links)[:WARMUP_IMAGES]:
+        get_article_image(link)
+
+def warm_section(url):
+    articles = listing_cache.refresh(('section', url), lambda: load_section(url))
+    prefetch_images([a.get('link') for a in articles])
+
+def warm_homepage():
+    bbc_url = 'https://www.bbc.com/'
+    sections_news = listing_cache.refresh(('homepage', bbc_url, False), lambda: load_homepage(bbc_url, False))
+    prefetch_images([a.get('news_link') for items in sections_news.values() for a in items])
+
+def warm_language(lang):
+    sections_news = listing_cache.refresh(('language', lang, False), lambda: load_language_front(lang, False))
+    prefetch_images([a.get('news_link') for items in sections_news.values() for a in items])
+
+def start_warmup():
+    """Register every topic section, the homepage and the chosen language fronts, then start"""
+    for section_url in sorted(set(url_mapping.values())):
+        warmup_scheduler.add(f"section:{section_url}", WARMUP_SECTION_INTERVAL,
+                             functools.partial(warm_section, section_url))
+    warmup_scheduler.add("homepage", WARMUP_HOMEPAGE_INTERVAL, warm_homepage)
+
+    if WARMUP_LANGUAGES.strip().lower() == 'all':
+        languages = list(urls)
+    else:
+        languages = [l.strip().lower() for l in WARMUP_LANGUAGES.split(',') if l.strip().lower() in urls]
+    # The English front is not a World Service page; the homepage and sections keep it warm
+    languages = [l for l in languages if l != 'english']
+    for lang_url in sorted(set(urls[l] for l in languages)):
+        warmup_scheduler.add(f"language:{lang_url}", WARMUP_LANGUAGE_INTERVAL,
+                             functools.partial(warm_language, lang_url))
+
+    warmup_scheduler.start(warmup_timeout=WARMUP_TIMEOUT)
+
+index_cached_listings()
+
+if WARMUP_ENABLED:
+    start_warmup()
 
 # Remove legacy endpoints for simplicity
 
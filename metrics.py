@@ -0,0 +1,271 @@
+import functools
+import threading
+import time
+
+# ================ METRICS ================
+# In-process counters, gauges and histograms rendered in the Prometheus text
+# exposition format by the /metrics endpoint. Every metric is labelled; label
+# values are given in the order of the metric's `labels`.
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing count per label set"""
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, values, (), value) for values, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value that goes up and down per label set"""
+    kind = 'gauge'
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values, value):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observations per label set"""
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *label_values, value):
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for values, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append((self.name + '_bucket', values, (('le', _format_value(bound)),), cumulative))
+                samples.append((self.name + '_bucket', values, (('le', '+Inf'),), count))
+                samples.append((self.name + '_sum', values, (), round(total, 6)))
+                samples.append((self.name + '_count', values, (), count))
+        return samples
+
+
+class Registry:
+    """Named metrics plus collectors that report values computed at scrape time"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """collect() returns [(metric, [(label values, value)])] for fresh gauges/counters"""
+        self._collectors.append(collect)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        families = [(metric, metric.samples()) for metric in self._metrics]
+        for collect in self._collectors:
+            for metric, values in collect():
+                families.append((metric, [(metric.name, labels, (), value) for labels, value in values]))
+
+        for metric, samples in families:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, values, extra, value in samples:
+                lines.append(f"{name}{_format_labels(metric.labels, values, extra)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+stage_seconds = registry.register(Histogram(
+    'bbc_stage_duration_seconds', 'Time spent in each pipeline stage', labels=('stage',)))
+upstream_seconds = registry.register(Histogram(
+    'bbc_upstream_request_duration_seconds', 'Upstream request time until response headers', labels=('host',)))
+upstream_responses = registry.register(Counter(
+    'bbc_upstream_responses_total', 'Upstream responses by host and status code', labels=('host', 'status')))
+upstream_in_flight = registry.register(Gauge(
+    'bbc_upstream_requests_in_flight', 'Upstream requests waiting for response headers', labels=('host',)))
+upstream_queue_seconds = registry.register(Histogram(
+    'bbc_upstream_queue_wait_seconds', 'Time upstream calls waited for a rate limit token and in-flight slot',
+    labels=('host', 'priority')))
+upstream_hedges = registry.register(Counter(
+    'bbc_upstream_hedged_total', 'Duplicate requests sent after the first outlasted the host p95', labels=('host',)))
+upstream_hedge_wins = registry.register(Counter(
+    'bbc_upstream_hedge_wins_total', 'Hedged requests where the duplicate answered first', labels=('host',)))
+upstream_deadline_exceeded = registry.register(Counter(
+    'bbc_upstream_deadline_exceeded_total', 'Upstream calls not made because the request deadline had passed',
+    labels=('host',)))
+http_seconds = registry.register(Histogram(
+    'bbc_http_request_duration_seconds', 'Time to produce a response per endpoint', labels=('endpoint',)))
+http_responses = registry.register(Counter(
+    'bbc_http_responses_total', 'Responses by endpoint and status code', labels=('endpoint', 'status')))
+http_in_flight = registry.register(Gauge(
+    'bbc_http_requests_in_flight', 'Requests currently being handled', labels=('endpoint',)))
+
+
+def observe_stage(stage, seconds):
+    stage_seconds.observe(stage, value=seconds)
+
+
+def timed(stage):
+    """Decorator recording each call's duration under bbc_stage_duration_seconds{stage=...}"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe_stage(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class Stage:
+    """Context manager form of timed(), for a block inside a function"""
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe_stage(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+def upstream_started(host):
+    upstream_in_flight.inc(host)
+    return time.perf_counter()
+
+
+def upstream_finished(host, start, status):
+    """Record an upstream request started with upstream_started(); status None means it failed"""
+    upstream_in_flight.dec(host)
+    upstream_seconds.observe(host, value=time.perf_counter() - start)
+    upstream_responses.inc(host, 'error' if status is None else str(status))
+
+
+# Cache and single-flight stats, read from their stats() at scrape time
+cache_hits = Counter('bbc_cache_hits_total', 'Cache hits (fresh and stale for snapshot caches)', labels=('cache',))
+cache_misses = Counter('bbc_cache_misses_total', 'Cache misses', labels=('cache',))
+cache_hit_ratio = Gauge('bbc_cache_hit_ratio', 'Hits / lookups since start', labels=('cache',))
+cache_size = Gauge('bbc_cache_entries', 'Entries currently held', labels=('cache',))
+flight_shared = Counter('bbc_singleflight_shared_total', 'Callers that joined an in-flight load', labels=('flight',))
+flight_in_flight = Gauge('bbc_singleflight_in_flight', 'Loads currently in flight', labels=('flight',))
+
+
+def cache_collector(caches, flights=()):
+    """Collector for registry.add_collector() over TTLCache/SnapshotCache and SingleFlight objects"""
+    def collect():
+        hits, misses, ratios, sizes = [], [], [], []
+        for cache in caches:
+            stats = cache.stats()
+            hit_count = stats.get('hits', stats.get('fresh_hits', 0) + stats.get('stale_hits', 0))
+            lookups = hit_count + stats.get('misses', 0)
+            hits.append(((stats['name'],), hit_count))
+            misses.append(((stats['name'],), stats.get('misses', 0)))
+            ratios.append(((stats['name'],), round(hit_count / lookups, 4) if lookups else 0.0))
+            sizes.append(((stats['name'],), stats.get('size', 0)))
+        shared, in_flight = [], []
+        for flight in flights:
+            stats = flight.stats()
+            shared.append(((stats['name'],), stats.get('shared', 0)))
+            in_flight.append(((stats['name'],), stats.get('in_flight', 0)))
+        return [(cache_hits, hits), (cache_misses, misses), (cache_hit_ratio, ratios), (cache_size, sizes),
+                (flight_shared, shared), (flight_in_flight, in_flight)]
+    return collect
+
+
+# Circuit breaker state per upstream host, read from their stats() at scrape time
+CIRCUIT_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+circuit_state = Gauge('bbc_circuit_state', 'Circuit state per host: 0 closed, 1 half-open, 2 open', labels=('host',))
+circuit_opened = Counter('bbc_circuit_opened_total', 'Times the circuit has opened', labels=('host',))
+circuit_rejected = Counter('bbc_circuit_rejected_total', 'Calls rejected while the circuit was open', labels=('host',))
+
+
+def breaker_collector(breakers):
+    """Collector for registry.add_collector(); breakers() returns the current CircuitBreaker objects"""
+    def collect():
+        states, opened, rejected = [], [], []
+        for breaker in breakers():
+            stats = breaker.stats()
+            states.append(((stats['name'],), CIRCUIT_STATES[stats['state']]))
+            opened.append(((stats['name'],), stats['opened']))
+            rejected.append(((stats['name'],), stats['rejected']))
+        return [(circuit_state, states), (circuit_opened, opened), (circuit_rejected, rejected)]
+    return collect
+
+
+# Upstream governor queues per host, read from their stats() at scrape time
+queue_depth = Gauge('bbc_upstream_queue_depth', 'Upstream calls waiting for their turn', labels=('host', 'priority'))
+governor_in_flight = Gauge('bbc_upstream_governor_in_flight', 'Upstream calls holding an in-flight slot', labels=('host',))
+queue_timeouts = Counter('bbc_upstream_queue_timeouts_total', 'Upstream calls that gave up waiting for their turn',
+                         labels=('host',))
+
+
+def governor_collector(governors, priority_names):
+    """Collector for registry.add_collector(); governors() returns the current HostGovernor objects"""
+    def collect():
+        depths, in_flight, timeouts = [], [], []
+        for governor in governors():
+            stats = governor.stats()
+            for level, name in enumerate(priority_names):
+                depths.append(((stats['name'], name), stats['queued_by_priority'].get(level, 0)))
+            in_flight.append(((stats['name'],), stats['in_flight']))
+            timeouts.append(((stats['name'],), stats['timeouts']))
+        return [(queue_depth, depths), (governor_in_flight, in_flight), (queue_timeouts, timeouts)]
+    return collect
@@ -0,0 +1,242 @@
+import lxml.html
+from lxml import etree
+
+# ================ LISTING PARSERS ================
+# lxml + precompiled XPath parsers for BBC section pages and the homepage.
+# Each parser walks the document once and pulls title, link, summary and image
+# for every card.
+
+# Article link patterns per section, checked in order against the section URL:
+# (section URL fragment, link fragments (any may match), link must contain a digit)
+SECTION_LINK_PATTERNS = [
+    ('/sport', ('/sport/',), True),
+    ('/news/technology', ('/news/technology/', '/news/articles/'), False),
+    ('/news/science', ('/news/science', '/news/articles/'), False),
+    ('/news/business', ('/news/business/', '/news/articles/'), False),
+    ('/news/politics', ('/news/politics/', '/news/articles/'), False),
+    ('/news/world', ('/news/world/', '/news/articles/'), False),
+    ('/news/health', ('/news/health/', '/news/articles/'), False),
+    ('/news/entertainment', ('/news/entertainment', '/news/articles/'), False),
+]
+# Pattern for any other section, and the broader one used when nothing matched
+DEFAULT_LINK_PATTERN = (('/news/articles/', '/sport/'), False)
+BROAD_LINK_PATTERN = (('/news/', '/sport/'), True)
+MIN_LINK_LENGTH = 20
+BROAD_MIN_LINK_LENGTH = 30
+
+# Titles that belong to section headers and navigation rather than articles
+SKIP_TITLE_WORDS = ['video', 'more', 'also in', 'only from', 'insight', 'live', 'watch', 'listen']
+
+# Cards per homepage section that get_eng() keeps
+HOMEPAGE_CARDS_PER_SECTION = 8
+
+
+def _ends_with(attr, suffix):
+    """XPath 1.0 has no ends-with(), so compare the attribute's tail instead"""
+    return f"substring(@{attr}, string-length(@{attr}) - {len(suffix) - 1}) = '{suffix}'"
+
+
+ANCHORS = etree.XPath('//a[@href]')
+FIRST_H3 = etree.XPath('(.//h3)[1]')
+FIRST_SPAN = etree.XPath('(.//span)[1]')
+FIRST_P = etree.XPath('(.//p)[1]')
+FIRST_H2 = etree.XPath('(.//h2)[1]')
+FIRST_IMG = etree.XPath('(.//img)[1]')
+FIRST_A = etree.XPath('(.//a)[1]')
+
+HOMEPAGE_SECTIONS = etree.XPath(f"//*[self::section or self::div][{_ends_with('data-testid', '-section')}]")
+SECTION_TITLE = etree.XPath(f"(.//*[self::h2 or self::div][{_ends_with('data-testid', '-title-wrapper')}])[1]")
+SECTION_CARDS = etree.XPath(f".//div[{_ends_with('data-testid', '-card')}]")
+CARD_HEADLINE = etree.XPath("(.//h2[@data-testid='card-headline'])[1]")
+CARD_DESCRIPTION = etree.XPath("(.//p[@data-testid='card-description'])[1]")
+
+
+def _first(xpath, elem):
+    found = xpath(elem)
+    return found[0] if found else None
+
+
+def _text(elem):
+    return elem.text_content().strip() if elem is not None else ""
+
+
+def _document(content):
+    """Parse page bytes into an lxml tree, or None for an empty/unparseable page"""
+    try:
+        return lxml.html.document_fromstring(content)
+    except (etree.ParserError, ValueError):
+        return None
+
+
+def _link_pattern(section_url):
+    for fragment, link_fragments, needs_digit in SECTION_LINK_PATTERNS:
+        if fragment in section_url:
+            return link_fragments, needs_digit
+    return DEFAULT_LINK_PATTERN
+
+
+def _matches(href, link_fragments, needs_digit, min_length):
+    return (len(href) > min_length
+            and any(f in href for f in link_fragments)
+            and (not needs_digit or any(char.isdigit() for char in href)))
+
+
+def listing_image(img):
+    """First srcset candidate of an <img>, or its src"""
+    if img is None:
+        return ""
+    srcset = img.get('srcset')
+    if srcset:
+        return srcset.split(',')[0].split(' ')[0]
+    return img.get('src', "")
+
+
+def listing_srcset(img):
+    """The full srcset of an <img> (or its src), for srcset_image() to choose from later"""
+    if img is None:
+        return ""
+    return img.get('srcset') or img.get('src', "")
+
+
+def srcset_image(srcset, width=None):
+    """Pick a URL from a srcset string for a display `width` in pixels.
+
+    Returns the narrowest candidate at least `width` wide, else the widest one.
+    Without a width, or without `w` descriptors, the first candidate is used. A
+    plain URL is returned as-is.
+    """
+    candidates = []
+    for part in (srcset or '').split(','):
+        fields = part.split()
+        if not fields:
+            continue
+        descriptor = fields[1] if len(fields) > 1 else ''
+        size = int(descriptor[:-1]) if descriptor.endswith('w') and descriptor[:-1].isdigit() else None
+        candidates.append((fields[0], size))
+    if not candidates:
+        return ""
+
+    sized = [c for c in candidates if c[1]]
+    if not width or not sized:
+        return candidates[0][0]
+    wide_enough = [c for c in sized if c[1] >= width]
+    if wide_enough:
+        return min(wide_enough, key=lambda c: c[1])[0]
+    return max(sized, key=lambda c: c[1])[0]
+
+
+def absolute_bbc_url(href):
+    return f"https://www.bbc.com{href}" if href.startswith('/') else href
+
+
+def _card_title(link, text):
+    """The link text if long enough, else the first h3/span/p up to three parents up"""
+    if text and len(text) > 10:
+        return text
+
+    parent = link.getparent()
+    for _ in range(3):  # Check up to 3 levels up
+        if parent is None:
+            break
+        h3 = _first(FIRST_H3, parent)
+        if h3 is not None:
+            return _text(h3)
+        span_text = _text(_first(FIRST_SPAN, parent))
+        if len(span_text) > 10:
+            return span_text
+        p_text = _text(_first(FIRST_P, parent))
+        if len(p_text) > 10:
+            return p_text
+        parent = parent.getparent()
+    return ''
+
+
+def parse_section(content, section_url):
+    """Parse every article card on a BBC section page"""
+    doc = _document(content)
+    if doc is None:
+        return []
+
+    link_fragments, needs_digit = _link_pattern(section_url)
+    broad_fragments, broad_needs_digit = BROAD_LINK_PATTERN
+
+    # One pass over the anchors collects both the section-specific matches and
+    # the broader fallback matches
+    links = []
+    broad_links = []
+    for a in ANCHORS(doc):
+        href = a.get('href')
+        if not href:
+            continue
+        if _matches(href, link_fragments, needs_digit, MIN_LINK_LENGTH):
+            links.append(a)
+        elif not links and _matches(href, broad_fragments, broad_needs_digit, BROAD_MIN_LINK_LENGTH):
+            broad_links.append(a)
+
+    articles = []
+    seen_titles = set()
+    for link in links or broad_links:
+        href = link.get('href')
+        title = _card_title(link, link.text_content().strip())
+
+        # Skip if title is too short, already seen, or is a section header
+        if not title or len(title) <= 15 or title in seen_titles:
+            continue
+        if any(skip in title.lower() for skip in SKIP_TITLE_WORDS):
+            continue
+        seen_titles.add(title)
+
+        parent = link.getparent()
+        img = _first(FIRST_IMG, parent) if parent is not None else None
+        articles.append({
+            "title": title,
+            "summary": _text(_first(FIRST_P, parent)) if parent is not None else "",
+            "image": listing_image(img),
+            "image_srcset": listing_srcset(img),
+            "link": absolute_bbc_url(href)
+        })
+
+    return articles
+
+
+def parse_homepage(content, latest=False):
+    """Parse the BBC homepage into {section title: [news items]}"""
+    sections_news = {}
+    doc = _document(content)
+    if doc is None:
+        return sections_news
+
+    for section in HOMEPAGE_SECTIONS(doc):
+        title_elem = _first(SECTION_TITLE, section)
+        if title_elem is not None:
+            if title_elem.tag != 'h2':
+                title_elem = _first(FIRST_H2, title_elem)
+            title_text = _text(title_elem) if title_elem is not None else "Latest"
+        else:
+            title_text = "Latest"
+
+        sec_news = []
+        for card in SECTION_CARDS(section)[:HOMEPAGE_CARDS_PER_SECTION]:
+            heading_text = _text(_first(CARD_HEADLINE, card))
+            if not heading_text:  # Only add if we have a title
+                continue
+
+            link_elem = _first(FIRST_A, card)
+            href = link_elem.get('href') if link_elem is not None else None
+
+            img = _first(FIRST_IMG, card)
+            sec_news.append({
+                "title": heading_text,
+                "summary": _text(_first(CARD_DESCRIPTION, card)),
+                "image_link": listing_image(img),
+                "image_srcset": listing_srcset(img),
+                "news_link": absolute_bbc_url(href) if href else ""
+            })
+
+        if sec_news:
+            sections_news[title_text] = sec_news
+
+        if latest:
+            break
+
+    return sections_news
@@ -0,0 +1,116 @@
+import heapq
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+logger = logging.getLogger('BBC-API')
+
+# ================ WARM-UP SCHEDULER ================
+
+
+class WarmupScheduler:
+    """In-process scheduler that re-runs refresh jobs ahead of demand.
+
+    Each target has its own interval; every run is rescheduled with +/- `jitter`
+    (a fraction of the interval) so targets don't fire in lockstep. At most
+    `max_concurrency` jobs run at once, and a job that is still running is not
+    started again.
+    """
+
+    def __init__(self, max_concurrency=2, jitter=0.1):
+        self.max_concurrency = max_concurrency
+        self.jitter = jitter
+        self._targets = {}
+        self._queue = []
+        self._running = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='warmup')
+        self._thread = None
+        self.runs = 0
+        self.failures = 0
+
+    def add(self, name, interval, job):
+        """Register job() to run every `interval` seconds"""
+        with self._lock:
+            self._targets[name] = (interval, job)
+
+    def start(self, warmup_timeout=None):
+        """Run every target once (the warm-up phase), then keep them refreshed.
+
+        With a `warmup_timeout`, block up to that many seconds for the warm-up
+        phase to finish before returning; otherwise it runs in the background.
+        """
+        if self._thread is not None:
+            return
+
+        with self._lock:
+            names = list(self._targets)
+        futures = [self._submit(name) for name in names]
+        if warmup_timeout:
+            wait([f for f in futures if f], timeout=warmup_timeout)
+
+        with self._lock:
+            for name in names:
+                heapq.heappush(self._queue, (self._next_run(name), name))
+
+        self._thread = threading.Thread(target=self._loop, name='warmup-scheduler', daemon=True)
+        self._thread.start()
+        logger.info("Warm-up scheduler started with %d targets", len(names))
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        self._executor.shutdown(wait=False)
+
+    def _next_run(self, name):
+        interval = self._targets[name][0]
+        return time.time() + interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _submit(self, name):
+        with self._lock:
+            if name in self._running:
+                return None
+            self._running.add(name)
+        return self._executor.submit(self._run, name)
+
+    def _run(self, name):
+        job = self._targets[name][1]
+        try:
+            job()
+            with self._lock:
+                self.runs += 1
+        except Exception as e:
+            logger.warning("Warm-up job %s failed: %s", name, e)
+            with self._lock:
+                self.failures += 1
+        finally:
+            with self._lock:
+                self._running.discard(name)
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            with self._lock:
+                due_at, name = self._queue[0] if self._queue else (time.time() + 60, None)
+            delay = due_at - time.time()
+            if delay > 0:
+                self._wakeup.wait(delay)
+                self._wakeup.clear()
+                continue
+
+            with self._lock:
+                heapq.heappop(self._queue)
+                heapq.heappush(self._queue, (self._next_run(name), name))
+            self._submit(name)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "targets": len(self._targets),
+                "running": len(self._running),
+                "runs": self.runs,
+                "failures": self.failures,
+            }
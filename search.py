@@ -0,0 +1,131 @@
+import math
+import re
+import threading
+from collections import OrderedDict
+
+from canonical import article_key
+
+# ================ SEARCH INDEX ================
+# In-memory inverted index over every article seen in the cached listings.
+# Title matches weigh more than summary matches, which weigh more than body
+# matches; scores are tf-idf summed over the query terms.
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+TAG_RE = re.compile(r'<[^>]+>')
+
+STOPWORDS = frozenset(
+    'a an and are as at be but by for from has have in is it its of on or that the this to was were will with'.split())
+
+FIELD_WEIGHTS = {'title': 3.0, 'summary': 2.0, 'body': 1.0}
+
+
+def tokenize(text):
+    """Lowercased word tokens without stopwords"""
+    return [t for t in TOKEN_RE.findall((text or '').lower()) if t not in STOPWORDS]
+
+
+def html_to_text(content):
+    return TAG_RE.sub(' ', content or '')
+
+
+class SearchIndex:
+    """Thread-safe inverted index of articles keyed by canonical article key.
+
+    Each document keeps the listing fields needed to rebuild a /news article
+    (with the first URL it was seen under) and the set of sources (section URLs,
+    homepage sections) it was seen in. Once `maxsize` documents are indexed the
+    oldest one is dropped.
+    """
+
+    def __init__(self, maxsize=5000):
+        self.maxsize = maxsize
+        self._docs = OrderedDict()
+        self._postings = {}
+        self._lock = threading.Lock()
+
+    def add(self, url, title, summary='', image='', source='', tag=''):
+        """Index (or re-index) an article seen in a listing"""
+        if not url or not title:
+            return
+        key = article_key(url)
+        with self._lock:
+            doc = self._docs.get(key)
+            if doc is None:
+                doc = {'url': url, 'body': '', 'sources': set(), 'tag': tag}
+            elif doc['title'] == title and doc['summary'] == summary:
+                # Unchanged text: only the image and sources need updating
+                doc['image'] = image or doc['image']
+                doc['sources'].add(source)
+                self._docs.move_to_end(key)
+                return
+            else:
+                self._unindex(key, doc)
+            doc.update(title=title, summary=summary, image=image or doc.get('image', ''))
+            doc['sources'].add(source)
+            self._index(key, doc)
+
+    def add_body(self, url, content):
+        """Add the extracted body text of an article that is already indexed"""
+        key = article_key(url)
+        with self._lock:
+            doc = self._docs.get(key)
+            if doc is None:
+                return
+            self._unindex(key, doc)
+            doc['body'] = html_to_text(content)
+            self._index(key, doc)
+
+    def search(self, query, limit=10, source=None):
+        """Best-ranked documents containing every query term, optionally only from one source
+        (or any of a collection of sources)"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            postings = [self._postings.get(term) for term in terms]
+            if not all(postings):
+                return []
+            total = len(self._docs)
+            candidates = set.intersection(*(set(p) for p in postings))
+            if source:
+                sources = {source} if isinstance(source, str) else set(source)
+                candidates = {key for key in candidates if not sources.isdisjoint(self._docs[key]['sources'])}
+
+            scores = {}
+            for term_postings in postings:
+                idf = math.log(1 + total / len(term_postings))
+                for key in candidates:
+                    scores[key] = scores.get(key, 0.0) + term_postings[key] * idf
+
+            ranked = sorted(candidates, key=lambda key: -scores[key])[:limit]
+            return [dict(self._docs[key], score=round(scores[key], 4)) for key in ranked]
+
+    def __len__(self):
+        return len(self._docs)
+
+    def stats(self):
+        with self._lock:
+            return {"documents": len(self._docs), "terms": len(self._postings)}
+
+    def _index(self, key, doc):
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(doc.get(field)):
+                weights[term] = weights.get(term, 0.0) + weight
+        doc['terms'] = list(weights)
+        for term, weight in weights.items():
+            self._postings.setdefault(term, {})[key] = weight
+
+        self._docs[key] = doc
+        self._docs.move_to_end(key)
+        while len(self._docs) > self.maxsize:
+            old_key, old_doc = self._docs.popitem(last=False)
+            self._unindex(old_key, old_doc)
+
+    def _unindex(self, key, doc):
+        for term in doc.get('terms', ()):
+            term_postings = self._postings.get(term)
+            if term_postings is not None:
+                term_postings.pop(key, None)
+                if not term_postings:
+                    del self._postings[term]
@@ -0,0 +1,550 @@
+import contextlib
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
+from breaker import CircuitBreaker
+from governor import HostGovernor
+from cache import TTLCache
+import metrics
+
+# httpx is only needed by the ASGI app; its transport errors count as connection errors too
+try:
+    import httpx
+except ImportError:
+    httpx = None
+CONNECTION_ERRORS = (requests.ConnectionError, requests.Timeout) + ((httpx.TransportError,) if httpx else ())
+
+# ================ UPSTREAM CLIENT ================
+# One pooled, keep-alive session shared by every fetch to bbc.com and news.google.com
+
+# Number of per-host pools kept open and connections kept per host
+POOL_CONNECTIONS = int(os.getenv('UPSTREAM_POOL_CONNECTIONS', 10))
+POOL_MAXSIZE = int(os.getenv('UPSTREAM_POOL_MAXSIZE', 32))
+# Retries on connection errors and 502/503/504, with exponential backoff
+RETRIES = int(os.getenv('UPSTREAM_RETRIES', 2))
+RETRY_BACKOFF = float(os.getenv('UPSTREAM_RETRY_BACKOFF', 0.3))
+# Default timeout (seconds) when a caller doesn't pass one
+TIMEOUT = float(os.getenv('UPSTREAM_TIMEOUT', 10))
+# Most bytes fetch_head() reads while looking for </head>
+HEAD_MAX_BYTES = int(os.getenv('UPSTREAM_HEAD_MAX_BYTES', 64 * 1024))
+HEAD_CHUNK_SIZE = 8 * 1024
+# Origin rewrites, e.g. "https://www.bbc.com=http://127.0.0.1:8900", to send every
+# fetch to a local stub server instead (used by the offline benchmarks)
+HOST_OVERRIDES = [tuple(pair.strip().split('=', 1))
+                  for pair in os.getenv('UPSTREAM_HOST_OVERRIDES', '').split(',') if '=' in pair]
+
+# Per-host circuit breaker: open when at least CIRCUIT_ERROR_RATE of the last
+# CIRCUIT_WINDOW calls (and CIRCUIT_MIN_CALLS or more) failed or took longer than
+# CIRCUIT_SLOW_CALL seconds, then probe again after CIRCUIT_OPEN_SECONDS
+CIRCUIT_ENABLED = os.getenv('CIRCUIT_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+CIRCUIT_WINDOW = int(os.getenv('CIRCUIT_WINDOW', 50))
+CIRCUIT_MIN_CALLS = int(os.getenv('CIRCUIT_MIN_CALLS', 10))
+CIRCUIT_ERROR_RATE = float(os.getenv('CIRCUIT_ERROR_RATE', 0.5))
+CIRCUIT_SLOW_CALL = float(os.getenv('CIRCUIT_SLOW_CALL', 5.0))
+CIRCUIT_OPEN_SECONDS = float(os.getenv('CIRCUIT_OPEN_SECONDS', 30))
+# Timeouts shrink to ADAPTIVE_TIMEOUT_MULTIPLIER x the host's recent p95 latency
+# (never below ADAPTIVE_TIMEOUT_MIN seconds or above the caller's timeout)
+ADAPTIVE_TIMEOUT = os.getenv('ADAPTIVE_TIMEOUT', 'true').lower() not in ('0', 'false', 'no')
+ADAPTIVE_TIMEOUT_MIN = float(os.getenv('ADAPTIVE_TIMEOUT_MIN', 1.0))
+ADAPTIVE_TIMEOUT_MULTIPLIER = float(os.getenv('ADAPTIVE_TIMEOUT_MULTIPLIER', 4.0))
+
+# Per-host admission control: at most UPSTREAM_RATE_LIMIT requests per second (in bursts
+# of UPSTREAM_BURST) and UPSTREAM_MAX_IN_FLIGHT at once; 0 disables either. Per-host
+# overrides: UPSTREAM_HOST_LIMITS="news.google.com=5:10:8,..." (rate:burst:max_in_flight).
+# A call waits at most UPSTREAM_QUEUE_TIMEOUT seconds for its turn, and a 429 holds the
+# host back for its Retry-After (UPSTREAM_THROTTLE_PAUSE seconds when it has none)
+RATE_LIMIT = float(os.getenv('UPSTREAM_RATE_LIMIT', 20))
+BURST = int(os.getenv('UPSTREAM_BURST', 40))
+MAX_IN_FLIGHT = int(os.getenv('UPSTREAM_MAX_IN_FLIGHT', POOL_MAXSIZE))
+HOST_LIMITS = {host.strip(): tuple(limits.split(':'))
+               for host, limits in (pair.split('=', 1) for pair in os.getenv('UPSTREAM_HOST_LIMITS', '').split(',')
+                                    if '=' in pair)}
+QUEUE_TIMEOUT = float(os.getenv('UPSTREAM_QUEUE_TIMEOUT', 30))
+THROTTLE_PAUSE = float(os.getenv('UPSTREAM_THROTTLE_PAUSE', 5))
+
+# Hedged requests: a GET/HEAD still unanswered after the host's recent p95 latency
+# (at least HEDGE_MIN_DELAY seconds) gets one duplicate, and the first answer wins.
+# At most HEDGE_MAX_IN_FLIGHT hedged calls run at once; the rest go out unhedged
+HEDGE_ENABLED = os.getenv('HEDGE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', 0.05))
+HEDGE_MAX_IN_FLIGHT = int(os.getenv('HEDGE_MAX_IN_FLIGHT', 8))
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+
+# Request deadlines: a request-wide deadline set with `with deadline(seconds):` bounds every upstream
+# call made in that context (and in contexts copied from it for worker threads):
+# each call's timeout is cut to the time left, and once it has passed calls raise
+# DeadlineExceeded instead of going out.
+
+_deadline = contextvars.ContextVar('upstream_deadline', default=None)
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """Bound upstream calls in this block to `seconds` from now (None for no bound)"""
+    if seconds is None:
+        yield
+        return
+    end = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(end if outer is None else min(end, outer))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining(limit=None):
+    """Seconds left before the current deadline, at most `limit`; `limit` when no deadline is set"""
+    end = _deadline.get()
+    if end is None:
+        return limit
+    left = max(0.0, end - time.monotonic())
+    return left if limit is None else min(limit, left)
+
+
+def expired():
+    """Whether the current deadline has passed"""
+    return remaining() == 0
+
+
+# Timeout of the upstream call in progress, which each retry of it gets again
+_attempt_timeout = contextvars.ContextVar('upstream_attempt_timeout', default=None)
+
+
+class DeadlineRetry(Retry):
+    """Retry that only retries when the backoff and another full attempt fit in the current deadline"""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        new_retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        if _deadline.get() is not None:
+            # What sleep() is about to wait: Retry-After if the response sent one, else the backoff
+            wait = (self.respect_retry_after_header and response is not None
+                    and new_retry.get_retry_after(response)) or new_retry.get_backoff_time()
+            if remaining() < wait + (_attempt_timeout.get() or 0):
+                raise MaxRetryError(_pool, url, error or ResponseError('no time left before the request deadline'))
+        return new_retry
+
+
+# Priorities for the per-host queues, most urgent first: foreground request work
+# (listings, /extract), og:image lookups, then background refreshes and warm-up,
+# which is what anything not run under `with priority(...)` counts as
+FOREGROUND, IMAGES, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = ('foreground', 'images', 'background')
+_priority = contextvars.ContextVar('upstream_priority', default=BACKGROUND)
+
+
+@contextlib.contextmanager
+def priority(level):
+    """Queue upstream calls in this block (and contexts copied from it) at `level`"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+def detached(fn):
+    """fn wrapped to run in a fresh context holding only the current priority.
+
+    For work that may outlive the request, such as image lookups left to fill
+    the cache: it doesn't inherit the request deadline. One wrapper per call.
+    """
+    context = contextvars.Context()
+    context.run(_priority.set, current_priority())
+    return functools.partial(context.run, fn)
+
+
+def create_session():
+    """Build a requests session with per-host connection pools and retries"""
+    retry = DeadlineRetry(
+        total=RETRIES,
+        connect=RETRIES,
+        read=RETRIES,
+        status=RETRIES,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+
+    s = requests.Session()
+    s.headers.update(DEFAULT_HEADERS)
+    s.mount('https://', adapter)
+    s.mount('http://', adapter)
+    return s
+
+
+session = create_session()
+
+
+class UpstreamError(Exception):
+    """Raised when an upstream page answers with a non-200 status"""
+
+    def __init__(self, url, status):
+        super().__init__(f"{url} returned status code: {status}")
+        self.url = url
+        self.status = status
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised instead of calling a host whose circuit breaker is open"""
+
+    def __init__(self, url):
+        super().__init__(url, 503)
+        self.args = (f"{url} not fetched: circuit open for {host_of(url)}",)
+
+
+class UpstreamBusy(UpstreamError):
+    """Raised when a call waited UPSTREAM_QUEUE_TIMEOUT for its turn at a rate-limited host"""
+
+    def __init__(self, url):
+        super().__init__(url, 503)
+        self.args = (f"{url} not fetched: queued too long for {host_of(url)}",)
+
+
+class DeadlineExceeded(UpstreamError):
+    """Raised instead of calling upstream once the request deadline has passed"""
+
+    def __init__(self, url):
+        super().__init__(url, 504)
+        self.args = (f"{url} not fetched: request deadline exceeded",)
+
+# (ETag/Last-Modified, parsed result) for each (url, key), so a 304 only ever
+# confirms the body that key's result was parsed from
+CONDITIONAL_CACHE_SIZE = int(os.getenv('CONDITIONAL_CACHE_SIZE', 2000))
+CONDITIONAL_CACHE_TTL = int(os.getenv('CONDITIONAL_CACHE_TTL', 24 * 3600))
+_parsed = TTLCache(maxsize=CONDITIONAL_CACHE_SIZE, ttl=CONDITIONAL_CACHE_TTL, name='parsed')
+
+
+def rewrite_url(url):
+    """Apply HOST_OVERRIDES to url"""
+    for origin, replacement in HOST_OVERRIDES:
+        if url == origin or url.startswith(origin + '/'):
+            return replacement + url[len(origin):]
+    return url
+
+
+def host_of(url):
+    """Host label for upstream metrics"""
+    return urlsplit(url).hostname or ''
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(host):
+    """The CircuitBreaker of an upstream host, created on first use"""
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker(
+                host, window=CIRCUIT_WINDOW, min_calls=CIRCUIT_MIN_CALLS, error_rate=CIRCUIT_ERROR_RATE,
+                slow_call=CIRCUIT_SLOW_CALL, open_seconds=CIRCUIT_OPEN_SECONDS, adaptive_timeout=ADAPTIVE_TIMEOUT,
+                min_timeout=ADAPTIVE_TIMEOUT_MIN, timeout_multiplier=ADAPTIVE_TIMEOUT_MULTIPLIER)
+        return breaker
+
+
+def breakers():
+    with _breakers_lock:
+        return list(_breakers.values())
+
+
+def admit(url, timeout):
+    """Check the deadline and url's circuit before a call.
+
+    Returns (breaker, timeout to use, whether the deadline cut the timeout) or
+    raises DeadlineExceeded/CircuitOpenError.
+    """
+    host = host_of(url)
+    timeout = timeout or TIMEOUT
+    left = remaining(timeout)
+    if left == 0:
+        metrics.upstream_deadline_exceeded.inc(host)
+        raise DeadlineExceeded(url)
+    breaker = breaker_for(host)
+    if CIRCUIT_ENABLED and not breaker.allow():
+        raise CircuitOpenError(url)
+    return breaker, breaker.timeout(left), left < timeout
+
+
+def settle(breaker, status, elapsed, clamped):
+    """Report a call let through by admit() to its breaker.
+
+    A call that failed after the deadline cut its timeout short says nothing
+    about the host, so it isn't counted against it.
+    """
+    if status is None and clamped:
+        breaker.skip()
+    else:
+        breaker.record(succeeded(status), elapsed)
+
+
+_governors = {}
+_governors_lock = threading.Lock()
+
+
+def governor_for(host):
+    """The HostGovernor of an upstream host, created on first use"""
+    with _governors_lock:
+        governor = _governors.get(host)
+        if governor is None:
+            rate, burst, max_in_flight = HOST_LIMITS.get(host, (RATE_LIMIT, BURST, MAX_IN_FLIGHT))
+            governor = _governors[host] = HostGovernor(
+                host, rate=float(rate), burst=int(burst), max_in_flight=int(max_in_flight))
+        return governor
+
+
+def governors():
+    with _governors_lock:
+        return list(_governors.values())
+
+
+def queue_timeout():
+    """How long a call may wait for its turn: UPSTREAM_QUEUE_TIMEOUT, or less if the deadline is nearer"""
+    return remaining(QUEUE_TIMEOUT)
+
+
+def admitted(url, breaker, governor, waited, timeout, clamped):
+    """Check a governor acquire() result for a call admit() let through.
+
+    Records the wait and returns (timeout, clamped) cut to what is left of the
+    deadline. If the wait timed out, or left no time for the call, the breaker
+    is released without counting the call and DeadlineExceeded/UpstreamBusy raised.
+    """
+    host = host_of(url)
+    if waited is not None:
+        metrics.upstream_queue_seconds.observe(host, PRIORITY_NAMES[current_priority()], value=waited)
+        left = remaining(timeout)
+        if left:
+            return left, clamped or left < timeout
+        governor.release()
+    breaker.skip()
+    if expired():
+        metrics.upstream_deadline_exceeded.inc(host)
+        raise DeadlineExceeded(url)
+    raise UpstreamBusy(url)
+
+
+def throttle(governor, status, headers):
+    """Hold a host back after it answered 429 Too Many Requests"""
+    if status != 429:
+        return
+    retry_after = headers.get('Retry-After', '')
+    governor.pause(float(retry_after) if retry_after.isdigit() else THROTTLE_PAUSE)
+
+
+def succeeded(status):
+    """Whether a response status counts as a healthy call for the circuit breaker"""
+    return status is not None and status < 500 and status != 429
+
+
+def is_outage(error):
+    """Whether a failed load means the host is failing (error status, connection
+    error, open circuit) rather than the caller running out of time or queue"""
+    if isinstance(error, (DeadlineExceeded, UpstreamBusy)):
+        return False
+    if isinstance(error, UpstreamError):
+        return not succeeded(error.status)
+    if isinstance(error, CONNECTION_ERRORS):
+        # A timeout the deadline cut short says nothing about the host
+        return not expired()
+    return False
+
+
+def _request(send, url, timeout, headers, **kwargs):
+    host = host_of(url)
+    # An open circuit or a spent deadline fails fast, before taking a token or slot
+    breaker, timeout, clamped = admit(url, timeout)
+    governor = governor_for(host)
+    waited = governor.acquire(current_priority(), queue_timeout())
+    timeout, clamped = admitted(url, breaker, governor, waited, timeout, clamped)
+    try:
+        start = metrics.upstream_started(host)
+        status = None
+        attempt = _attempt_timeout.set(timeout)
+        try:
+            response = send(rewrite_url(url), headers=headers, timeout=timeout, **kwargs)
+            status = response.status_code
+            throttle(governor, status, response.headers)
+            return response
+        finally:
+            _attempt_timeout.reset(attempt)
+            settle(breaker, status, time.perf_counter() - start, clamped)
+            metrics.upstream_finished(host, start, status)
+    finally:
+        governor.release()
+
+
+# Each hedged call holds a slot until both of its attempts are done, so the pool
+# (two threads per slot) never queues
+hedge_slots = threading.BoundedSemaphore(HEDGE_MAX_IN_FLIGHT)
+_hedge_pool = ThreadPoolExecutor(max_workers=2 * HEDGE_MAX_IN_FLIGHT, thread_name_prefix='hedge')
+
+
+def hedge_delay(url):
+    """Seconds to wait before hedging a call to url, or None when hedging is off or the host's p95 isn't known yet"""
+    if not HEDGE_ENABLED:
+        return None
+    p95 = breaker_for(host_of(url)).latency_p95()
+    return None if p95 is None else max(HEDGE_MIN_DELAY, p95)
+
+
+def _release_when_done(futures, release):
+    left = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            left[0] -= 1
+            if left[0]:
+                return
+        release()
+
+    for future in futures:
+        future.add_done_callback(done)
+
+
+def _close_response(future):
+    if future.exception() is None:
+        future.result().close()
+
+
+def _hedged(send, url, timeout, headers, **kwargs):
+    """_request(), raced against one duplicate if it outlasts the host's recent p95 latency"""
+    delay = hedge_delay(url)
+    if delay is None or not hedge_slots.acquire(blocking=False):
+        return _request(send, url, timeout, headers, **kwargs)
+
+    def attempt():
+        # Each attempt runs in its own copy of this context, deadline included
+        return _hedge_pool.submit(contextvars.copy_context().run, _request, send, url, timeout, headers, **kwargs)
+
+    attempts = [attempt()]
+    if not wait(attempts, timeout=delay).done and not expired():
+        metrics.upstream_hedges.inc(host_of(url))
+        attempts.append(attempt())
+    _release_when_done(attempts, hedge_slots.release)
+
+    for future in as_completed(attempts):
+        if future.exception() is None:
+            winner = future
+            break
+    else:
+        # Every attempt failed: raise the first one's error
+        winner = attempts[0]
+    for future in attempts:
+        if future is not winner:
+            future.add_done_callback(_close_response)
+    if winner is not attempts[0]:
+        metrics.upstream_hedge_wins.inc(host_of(url))
+    return winner.result()
+
+
+def get(url, timeout=None, headers=None, **kwargs):
+    """GET through the shared session"""
+    return _hedged(session.get, url, timeout, headers, **kwargs)
+
+
+def head(url, timeout=None, headers=None, **kwargs):
+    """HEAD through the shared session"""
+    return _hedged(session.head, url, timeout, headers, **kwargs)
+
+
+def fetch_head(url, timeout=None, max_bytes=None):
+    """Stream url only up to </head> (or max_bytes) and close the connection.
+
+    Returns (status, final_url, head_bytes). head_bytes is empty for any
+    status other than 200.
+    """
+    max_bytes = max_bytes or HEAD_MAX_BYTES
+    with get(url, timeout=timeout, stream=True) as response:
+        if response.status_code != 200:
+            return response.status_code, response.url, b''
+
+        data = b''
+        for chunk in response.iter_content(chunk_size=HEAD_CHUNK_SIZE):
+            data, done = append_head_chunk(data, chunk, max_bytes)
+            if done:
+                break
+
+    return 200, response.url, data
+
+
+def append_head_chunk(data, chunk, max_bytes):
+    """Add a streamed chunk; returns (data, done) once </head> or max_bytes is reached"""
+    # Only the overlap with the previous chunk and the new chunk need checking
+    search_from = max(0, len(data) - 6)
+    data += chunk
+    end = data.lower().find(b'</head>', search_from)
+    if end != -1:
+        return data[:end + 7], True
+    if len(data) >= max_bytes:
+        return data[:max_bytes], True
+    return data, False
+
+
+def fetch_parsed(url, parse, timeout=None, key=None):
+    """Conditionally GET url and return (status, parse(response)).
+
+    If the server answers 304 Not Modified, the result parsed from the last 200
+    is returned without downloading or parsing the body again. `key` separates
+    results when the same URL is parsed in more than one way. The result is
+    None for any status other than 200/304.
+    """
+    cache_key = (url, key)
+    headers = {}
+    cached = _parsed.get(cache_key)
+    if cached:
+        validators, _ = cached
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+
+    response = get(url, timeout=timeout, headers=headers)
+
+    if response.status_code == 304:
+        cached = _parsed.get(cache_key)
+        if cached:
+            return 200, cached[1]
+        # Result was dropped between the check and the response: fetch it in full
+        response = get(url, timeout=timeout)
+
+    if response.status_code != 200:
+        return response.status_code, None
+
+    with metrics.Stage('parse'):
+        result = parse(response)
+
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if etag or last_modified:
+        _parsed.set(cache_key, ({'etag': etag, 'last_modified': last_modified}, result), negative=False)
+    else:
+        _parsed.pop(cache_key)
+
+    return 200, result